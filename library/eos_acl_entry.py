@@ -33,9 +33,9 @@
 DOCUMENTATION = """
 ---
 module: eos_acl_entry
-short_description: Manage ACL entries (standard ACLs only)
+short_description: Manage standard and extended ACL entries
 description:
-  - This module will manage standard ACL entries on EOS nodes
+  - This module will manage standard and extended ACL entries on EOS nodes
 version_added: 1.1.0
 category: Route Policy
 author: Arista EOS+
@@ -49,11 +49,11 @@ notes:
 options:
   acltype:
     description:
-      - The type of ACL to manage.  Currently the only supported value for
-        acltype is 'standard'
+      - The type of ACL to manage.  Extended entries also match on the
+        protocol, the destination, the ports and the flags of the packet
     required: true
     default: null
-    choices: []
+    choices: ['standard', 'extended']
     aliases: []
     version_added: 1.1.0
   name:
@@ -68,7 +68,8 @@ options:
   seqno:
     description:
       - The sequence number of the rule that this entry corresponds to.
-    required: true
+        Either seqno or entries is required.
+    required: false
     default: null
     choices: []
     aliases: []
@@ -81,6 +82,15 @@ options:
     choices: []
     aliases: []
     version_added: 1.1.0
+  protocol:
+    description:
+      - The protocol matched by an extended entry, for instance ip, tcp,
+        udp, icmp or a protocol number
+    required: false
+    default: ip
+    choices: []
+    aliases: []
+    version_added: 1.3.0
   srcaddr:
     description:
       - The source address corresponding to this rule
@@ -98,6 +108,52 @@ options:
     choices: []
     aliases: []
     version_added: 1.1.0
+  srcport:
+    description:
+      - The source port match of an extended entry as shown in the
+        running-config, for instance "eq www https" or "range 1000 2000".
+        Well-known ports can be given by number or by name, EOS shows them
+        by name and they are compared by number
+    required: false
+    default: null
+    choices: []
+    aliases: []
+    version_added: 1.3.0
+  dstaddr:
+    description:
+      - The destination address of an extended entry.  Required for
+        extended entries
+    required: false
+    default: null
+    choices: []
+    aliases: []
+    version_added: 1.3.0
+  dstprefixlen:
+    description:
+      - The destination address prefix mask length of an extended entry
+    required: false
+    default: 32
+    choices: []
+    aliases: []
+    version_added: 1.3.0
+  dstport:
+    description:
+      - The destination port match of an extended entry, in the same form
+        as srcport
+    required: false
+    default: null
+    choices: []
+    aliases: []
+    version_added: 1.3.0
+  flags:
+    description:
+      - The keywords following the destination of an extended entry, for
+        instance "established" or "syn", as shown in the running-config
+    required: false
+    default: null
+    choices: []
+    aliases: []
+    version_added: 1.3.0
   log:
     description:
       - Enables or disables the log keyword
@@ -106,6 +162,64 @@ options:
     choices: []
     aliases: []
     version_added: 1.1.0
+  entries:
+    description:
+      - Converges the whole access list in a single task.  The value is a
+        list (or JSON encoded list) of entries, each with the seqno, action,
+        srcaddr, srcprefixlen and log keys of a single entry (plus the
+        extended entry keys for an extended ACL), or a seqno and a remark.
+        Entries can also be given in EOS syntax, for instance
+        "10 permit any,20 deny 10.0.0.0/8 log".  The access list is read
+        once and all added and removed entries are sent in a single
+        request.  With state=absent the listed sequence numbers are removed.
+        Mutually exclusive with seqno.
+    required: false
+    default: null
+    choices: []
+    aliases: []
+    version_added: 1.3.0
+  replace:
+    description:
+      - Removes the entries of the access list that are not in entries.
+    required: false
+    default: false
+    choices: BOOLEANS
+    aliases: []
+    version_added: 1.3.0
+  optimize:
+    description:
+      - Analyzes the entries in entries mode before they are pushed.  Entries
+        that never match because earlier entries cover their source,
+        duplicates of earlier entries and consecutive entries with the same
+        action on sibling prefixes that can be aggregated are reported in
+        the optimizer key of the result.  With 'apply' the minimized access
+        list is pushed instead of the entries and the entries it drops or
+        merges are removed from the access list, even without replace.
+        Only supported for standard ACLs.
+    required: false
+    default: none
+    choices: ['none', 'report', 'apply']
+    aliases: []
+    version_added: 1.3.0
+  replace_method:
+    description:
+      - Configures how a changed access list is pushed in entries mode.
+        With 'inplace' the entries are edited in the live access list.  With
+        'swap' the new access list is built under a temporary name that
+        no other access list uses, every ip access-group binding
+        (interfaces, control-plane, management or any other mode) is moved
+        to it while the access list is rebuilt and moved back, so bindings
+        never see a partially edited access list.  Entries that are not in
+        entries are kept unless replace is set.  Swap falls back to inplace
+        when the access list is not applied anywhere, or when replace is
+        not set and the access list has entries the module does not parse.
+        The push key of the result holds the method, the push time, the
+        bindings and the estimated number of TCAM programming events.
+    required: false
+    default: inplace
+    choices: ['inplace', 'swap']
+    aliases: []
+    version_added: 1.3.0
 """
 
 EXAMPLES = """
@@ -116,10 +230,51 @@ EXAMPLES = """
 - eos_acl_entry: seqno=20 name=foo action=deny srcaddr=172.16.10.0
   srcprefixlen=16
 
+- eos_acl_entry: acltype=extended seqno=10 name=web action=permit
+  protocol=tcp srcaddr=0.0.0.0 srcprefixlen=0 dstaddr=10.1.0.0
+  dstprefixlen=16 dstport="eq www https"
+
+- name: converge the whole access list
+  eos_acl_entry:
+    acltype: standard
+    name: foo
+    replace: true
+    entries:
+      - { seqno: 10, action: permit, srcaddr: 0.0.0.0, srcprefixlen: 0 }
+      - { seqno: 20, action: deny, srcaddr: 172.16.10.0, srcprefixlen: 16 }
+
+- name: rebuild a bound access list without editing it in place
+  eos_acl_entry:
+    acltype: standard
+    name: foo
+    replace: true
+    replace_method: swap
+    entries: "{{ acl_entries }}"
+
+- name: converge an extended access list
+  eos_acl_entry:
+    acltype: extended
+    name: web
+    replace: true
+    entries:
+      - 10 permit tcp any 10.1.0.0/16 eq www https
+      - 20 permit tcp any 10.1.0.0/16 established
+      - 30 deny ip any any log
+
 """
+import socket
+import struct
 #<<EOS_COMMON_MODULE_START>>
 
+import io
+import os
+import re
+import gzip
+import json
+import mmap
+import time
 import syslog
+import hashlib
 import collections
 
 from ansible.module_utils.basic import *
@@ -133,6 +288,17 @@ except ImportError:
 DEFAULT_SYSLOG_PRIORITY = syslog.LOG_NOTICE
 DEFAULT_CONNECTION = 'localhost'
 TRANSPORTS = ['socket', 'http', 'https', 'http_local']
+READERS = ['config', 'json']
+REPLAY_LATENCY = ['none', 'recorded']
+CONFIG_CHECKSUM_COMMAND = 'show running-config checksum'
+RUNNING_CONFIG_RE = re.compile(r'^show running-config(?: all)?(?: (.+))?$')
+BLOCK_END_RE = re.compile(r'\n(?=\S)')
+INTERFACE_BLOCK_RE = re.compile(r'^interface (\S+)\n((?: .*\n)*)', re.M)
+PORT_CHANNEL_RE = re.compile(r'^show port-channel (\d+) all-ports$')
+MODULE_NAME_RE = re.compile(r'^module: (\S+)', re.M)
+DEBUG_MAX_SIZE = 4096
+DEBUG_TRUNCATED = '... [%s bytes truncated]'
+MASKED_INPUT = 'VALUE_SPECIFIED_IN_NO_LOG_PARAMETER'
 
 class EosConnection(object):
 
@@ -178,6 +344,384 @@ class EosConnection(object):
         return node
 
 
+class DigestCache(object):
+    """Control node cache of resource digests from the last converge
+
+    Each entry is keyed by the digest of the desired state of a resource and
+    holds the config checksum of the node and the digest of the resource
+    config section observed after the last successful converge.  Entries
+    and hit statistics are stored as one JSON file per node so concurrent
+    tasks against different nodes never write the same file.
+
+    Args:
+        path (str): The directory used to store the cache files
+        name (str): The name of the node the cache file belongs to
+
+    """
+
+    def __init__(self, path, name):
+        self.filename = os.path.join(os.path.expanduser(path),
+                                     '%s.json' % name)
+        self.entries = dict()
+        self.stats = dict(hits=0, misses=0)
+        self.load()
+
+    def load(self):
+        try:
+            data = json.load(open(self.filename))
+        except (IOError, ValueError):
+            return
+        self.entries = data.get('entries', dict())
+        self.stats.update(data.get('stats', dict()))
+
+    def save(self):
+        dirname = os.path.dirname(self.filename)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        tmpfile = '%s.%s' % (self.filename, os.getpid())
+        with open(tmpfile, 'w') as fh:
+            json.dump(dict(entries=self.entries, stats=self.stats), fh)
+        os.rename(tmpfile, self.filename)
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, **kwargs):
+        self.entries[key] = kwargs
+
+    def record(self, hit):
+        self.stats['hits' if hit else 'misses'] += 1
+
+    def summary(self, hit):
+        total = self.stats['hits'] + self.stats['misses']
+        rate = float(self.stats['hits']) / total if total else 0.0
+        return dict(hit=hit, hits=self.stats['hits'],
+                    misses=self.stats['misses'], hit_rate=round(rate, 4))
+
+
+class ConfigCache(object):
+    """Control node cache of the last running-config read from a node
+
+    The running-config is stored with the config generation of the node,
+    the running-config checksum observed just before it was read.  A module
+    that observes the same generation reuses the stored running-config
+    instead of reading it from the node.  The cache is stored as one file
+    per node holding the generation on the first line.  The running-config
+    includes secrets so the file is only readable by its owner.  The file
+    is encoded as UTF-8.
+
+    Args:
+        path (str): The directory used to store the cache files
+        name (str): The name of the node the cache file belongs to
+
+    """
+
+    def __init__(self, path, name):
+        self.filename = os.path.join(os.path.expanduser(path),
+                                     '%s.config' % name)
+
+    def get(self, generation):
+        """Returns the cached running-config if the generation matches
+        """
+        try:
+            with io.open(self.filename, encoding='utf-8') as fh:
+                if fh.readline().rstrip('\n') != generation:
+                    return None
+                return fh.read()
+        except IOError:
+            return None
+
+    def set(self, generation, config):
+        dirname = os.path.dirname(self.filename)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname, 0700)
+        tmpfile = '%s.%s' % (self.filename, os.getpid())
+        fd = os.open(tmpfile, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+        with io.open(fd, 'w', encoding='utf-8') as fh:
+            fh.write(u'%s\n%s' % (generation, config))
+        os.rename(tmpfile, self.filename)
+
+
+class SnapshotConnection(object):
+    """Answers eAPI requests from a saved running-config file
+
+    The connection stands in for a pyeapi connection so a pyeapi Node built
+    on it serves the resource getters from the snapshot without any network
+    I/O.  The file is memory mapped and scoped running-config requests only
+    copy the matching sections, port-channel members are read from the
+    channel-group lines.  Configuration commands are not applied, they are
+    recorded in the commands attribute in the order they would have been
+    sent.
+
+    Args:
+        filename (str): The path to the saved "show running-config all"
+            output
+
+    """
+
+    def __init__(self, filename):
+        self.filename = os.path.expanduser(filename)
+        self.commands = list()
+        with open(self.filename) as fh:
+            self.config = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __str__(self):
+        return 'SnapshotConnection(filename=%s)' % self.filename
+
+    def execute(self, commands, encoding='json'):
+        results = list()
+        configure = False
+        for command in commands:
+            if isinstance(command, dict):
+                command = command['cmd']
+            if command in ['configure', 'configure terminal']:
+                configure = True
+                results.append(dict())
+            elif command == 'enable':
+                results.append(dict())
+            elif configure:
+                self.commands.append(command)
+                results.append(dict())
+            else:
+                results.append(self.show(command, encoding))
+        return dict(jsonrpc='2.0', result=results, id=id(self))
+
+    def show(self, command, encoding):
+        match = PORT_CHANNEL_RE.match(command)
+        if match and encoding == 'text':
+            return dict(output=self.port_channel(match.group(1)))
+
+        match = RUNNING_CONFIG_RE.match(command)
+        if not match:
+            raise pyeapi.eapilib.CommandError(1002, 'not available in '
+                                              'snapshot',
+                                              command_error=command)
+        if encoding != 'text':
+            raise pyeapi.eapilib.CommandError(1003, 'not supported in JSON '
+                                              'format')
+
+        scope = match.group(1)
+        if not scope:
+            output = self.config[:]
+        elif scope == 'checksum':
+            output = hashlib.sha1(self.config).hexdigest()
+        elif scope.startswith('interfaces '):
+            names = [re.escape(n) for n in scope.split()[1:]]
+            regex = re.compile(r'^interface (%s)$' % '|'.join(names), re.M)
+            output = self.section(regex)
+        elif scope.startswith('section '):
+            output = self.section(re.compile(scope[8:], re.M))
+        else:
+            raise pyeapi.eapilib.CommandError(1002, 'not available in '
+                                              'snapshot',
+                                              command_error=command)
+        return dict(output=output)
+
+    def section(self, regex):
+        """Returns the top level config blocks matching the regex
+        """
+        blocks = list()
+        block_end = 0
+        for match in regex.finditer(self.config):
+            if match.start() < block_end:
+                continue
+            start = self.config.rfind('\n', 0, match.start()) + 1
+            while start and self.config[start] == ' ':
+                start = self.config.rfind('\n', 0, start - 1) + 1
+            end = BLOCK_END_RE.search(self.config, match.end())
+            block_end = end.start() if end else len(self.config)
+            blocks.append(self.config[start:block_end])
+        return '\n'.join(blocks)
+
+    def port_channel(self, group):
+        """Returns the port-channel members from the channel-group lines
+        """
+        regex = re.compile(r'^\s+channel-group %s mode ' % group, re.M)
+        members = [m.group(1) for m in INTERFACE_BLOCK_RE.finditer(self.config)
+                   if regex.search(m.group(2))]
+        return 'Port Channel Port-Channel%s:\n  Active Ports: %s\n' % \
+            (group, ' '.join(members))
+
+
+class DryRunConnection(object):
+    """Collects the configuration requests of a check mode run
+
+    Requests that enter configuration mode are answered with empty results
+    and never sent to the node.  Their commands are recorded in the commands
+    attribute in the order they would have been sent.  All other requests
+    are sent through the wrapped connection so the module still reads the
+    current state of the node.
+
+    Args:
+        connection (EapiConnection): The pyeapi connection to wrap
+
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.commands = list()
+
+    def __str__(self):
+        return str(self.connection)
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+    def execute(self, commands, encoding='json', **kwargs):
+        names = [c['cmd'] if isinstance(c, dict) else c for c in commands]
+        if 'configure' not in names and 'configure terminal' not in names:
+            return self.connection.execute(commands, encoding, **kwargs)
+
+        configure = False
+        for command in names:
+            if configure:
+                self.commands.append(command)
+            configure = configure or command in ['configure',
+                                                 'configure terminal']
+        return dict(jsonrpc='2.0', result=[dict() for _ in commands],
+                    id=id(self))
+
+
+class RecordingConnection(object):
+    """Records the eAPI requests sent through a pyeapi connection
+
+    Every request is appended to the fixture file as one compact JSON line
+    holding the commands, the encoding, the latency in seconds and either
+    the result or the error returned by the node.  The input of commands,
+    such as the enable password, is never recorded and the mask function
+    is applied to the whole line before it is written.
+
+    Args:
+        connection (EapiConnection): The pyeapi connection to record
+        filename (str): The path to the fixture file, any existing file
+            is replaced
+        mask (callable): Returns the line with the secret values masked
+
+    """
+
+    def __init__(self, connection, filename, mask=None):
+        self.connection = connection
+        self.filename = os.path.expanduser(filename)
+        self.mask = mask
+        self.requests = 0
+        open(self.filename, 'w').close()
+
+    def __str__(self):
+        return str(self.connection)
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+    @staticmethod
+    def mask_input(commands):
+        """Returns the commands with the input of each command masked
+        """
+        return [dict(c, input=MASKED_INPUT)
+                if isinstance(c, dict) and 'input' in c else c
+                for c in commands]
+
+    def execute(self, commands, encoding='json', **kwargs):
+        entry = dict(commands=self.mask_input(commands), encoding=encoding)
+        start = time.time()
+        try:
+            response = self.connection.execute(commands, encoding, **kwargs)
+        except pyeapi.eapilib.CommandError as exc:
+            entry['error'] = dict(code=exc.error_code, message=exc.error_text,
+                                  command_error=exc.command_error,
+                                  output=exc.output)
+            raise
+        except pyeapi.eapilib.ConnectionError as exc:
+            entry['error'] = dict(message=exc.message)
+            raise
+        else:
+            entry['result'] = response['result']
+            return response
+        finally:
+            entry['latency'] = round(time.time() - start, 6)
+            if self.mask:
+                entry = self.mask(entry)
+            self.requests += 1
+            with open(self.filename, 'a') as fh:
+                fh.write(json.dumps(entry, separators=(',', ':')) + '\n')
+
+
+class ReplayConnection(object):
+    """Answers eAPI requests from a fixture file written by a recording
+
+    Requests are matched against the recorded requests in order.  A request
+    that does not match the next recorded request is matched against the
+    remaining recorded requests; when none matches a ConnectionError is
+    raised so an extra round trip fails the module run.  The commands are
+    masked as they were when recorded and matched without their input, the
+    replay is not configured with the enable password of the recording.
+
+    Args:
+        filename (str): The path to the fixture file
+        latency (str): "none" to answer immediately, "recorded" to wait for
+            the recorded latency or a number of milliseconds to wait for
+            each request
+        mask (callable): Returns the commands with the secret values masked
+
+    """
+
+    def __init__(self, filename, latency='none', mask=None):
+        self.filename = os.path.expanduser(filename)
+        with open(self.filename) as fh:
+            self.entries = [json.loads(l) for l in fh if l.strip()]
+        self.latency = latency
+        self.mask = mask
+        self.requests = 0
+        self.error = None
+        self._unused = range(len(self.entries))
+
+    def __str__(self):
+        return 'ReplayConnection(filename=%s)' % self.filename
+
+    @staticmethod
+    def strip_input(commands):
+        return [c['cmd'] if isinstance(c, dict) else c for c in commands]
+
+    def match(self, commands, encoding):
+        commands = self.strip_input(commands)
+        for index in self._unused:
+            entry = self.entries[index]
+            if self.strip_input(entry['commands']) == commands and \
+                    entry['encoding'] == encoding:
+                self._unused.remove(index)
+                return entry
+
+    def execute(self, commands, encoding='json', **kwargs):
+        self.requests += 1
+        commands = json.loads(json.dumps(commands))
+        entry = self.match(self.mask(commands) if self.mask else commands,
+                           encoding)
+        if entry is None:
+            self.error = pyeapi.eapilib.ConnectionError(
+                'replay', 'no recorded response for %s' % commands, commands)
+            raise self.error
+
+        if self.latency == 'recorded':
+            time.sleep(entry['latency'])
+        elif self.latency != 'none':
+            time.sleep(float(self.latency) / 1000)
+
+        error = entry.get('error')
+        if error and 'code' in error:
+            self.error = pyeapi.eapilib.CommandError(
+                error['code'], error['message'], commands=commands,
+                command_error=error['command_error'], output=error['output'])
+            raise self.error
+        elif error:
+            self.error = pyeapi.eapilib.ConnectionError(
+                'replay', error['message'], commands)
+            raise self.error
+        return dict(jsonrpc='2.0', result=entry['result'], id=id(self))
+
+    def summary(self):
+        return dict(requests=self.requests, recorded=len(self.entries),
+                    unused=len(self._unused))
+
+
 class EosAnsibleModule(AnsibleModule):
 
     meta_args = {
@@ -189,14 +733,24 @@ class EosAnsibleModule(AnsibleModule):
         'transport': dict(choices=TRANSPORTS),
         'port': dict(),
         'debug': dict(type='bool', default='false'),
-        'logging': dict(type='bool', default='true')
+        'logging': dict(type='bool', default='true'),
+        'reader': dict(default='config', choices=READERS),
+        'digest_cache': dict(),
+        'config_cache': dict(),
+        'snapshot': dict(),
+        'record': dict(),
+        'replay': dict(),
+        'replay_latency': dict(default='none'),
+        'debug_max_size': dict(type='int', default=DEBUG_MAX_SIZE),
+        'debug_dest': dict()
     }
 
     stateful_args = {
         'state': dict(default='present', choices=['present', 'absent']),
     }
 
-    def __init__(self, stateful=True, autorefresh=False, *args, **kwargs):
+    def __init__(self, stateful=True, autorefresh=False, reads_config=True,
+                 *args, **kwargs):
 
         kwargs['argument_spec'].update(self.meta_args)
 
@@ -238,11 +792,25 @@ class EosAnsibleModule(AnsibleModule):
         self._attributes = self.map_argument_spec()
         self.validate()
         self._autorefresh = autorefresh
-        self._node = EosConnection(**self.params)
-        self._node.connect()
+        self._reads_config = reads_config
+
+        if self.params['snapshot']:
+            self._node = self.load_snapshot()
+        elif self.params['replay']:
+            self._node = self.connect()
+        else:
+            self._node = EosConnection(**self.params)
+            self._node.connect()
+
+            self._node = self.connect()
 
-        self._node = self.connect()
         self._instance = None
+        self._digest_cache = None
+        self._generation = None
+
+        if self.params['config_cache'] and self._reads_config and \
+                not self.params['snapshot']:
+            self.load_config_cache()
 
         self.desired_state = self.params['state'] if self._stateful else None
         self.exit_after_flush = kwargs.get('exit_after_flush')
@@ -252,9 +820,17 @@ class EosAnsibleModule(AnsibleModule):
         if self._instance:
             return self._instance
 
-        func = self.func('instance')
-        if not func:
-            self.fail('Module does not support "instance"')
+        func = None
+        if self.params['reader'] == 'json':
+            func = self.func('instance_json')
+
+        if func:
+            self.log('Using json reader for instance')
+        else:
+            func = self.func('instance')
+            if not func:
+                self.fail('Module does not support "instance"')
+            self.load_scoped_config()
 
         try:
             self._instance = func(self)
@@ -268,10 +844,262 @@ class EosAnsibleModule(AnsibleModule):
     def attributes(self):
         return self._attributes
 
+    @property
+    def schema(self):
+        """Returns the attribute schema of the module
+
+        A module can define a SCHEMA dict, ordered by the commands to send,
+        mapping an attribute to a dict with the keys below.  The commands of
+        all changed schema attributes are rendered locally and sent in a
+        single request instead of calling a set_<attribute> function.
+
+            * normalize - a function applied to the value from the playbook
+            * compare - a function of the desired and current values that
+              returns True when they are equal
+            * command - the command template, formatted with the value and
+              the module attributes, or a function of the module, desired
+              value and current value returning a list of commands
+            * negate - the command template used when the value is False,
+              an empty string or equal to the default key of the schema
+
+        """
+        return globals().get('SCHEMA') or dict()
+
     @property
     def node(self):
         return self._node
 
+    def scoped_config(self, scope):
+        """Returns the running-config limited to a single scope
+
+        The scope is appended to "show running-config all" so any value
+        accepted by EOS can be used, for instance "interfaces Ethernet1" or
+        "section vlan 100".  A trailing "end" line is added so the pyeapi
+        block parsers find the end of the last section as they would in
+        the full running-config.
+
+        Args:
+            scope (str): The running-config filter to send to the node
+
+        Returns:
+            str: The scoped running-config as a string
+
+        """
+        command = 'show running-config all %s' % scope
+        resp = self.node.run_commands(command, 'text')
+        return '%s\nend' % resp[0]['output'].strip()
+
+    def resource_scope(self):
+        """Returns the single running-config scope of the resource
+
+        Returns:
+            str: The scope returned by the module config_scope function or
+                None if the module does not define one or returns more
+                than one scope
+
+        """
+        scope = self.invoke_function('config_scope', self)
+        if scope and not isinstance(scope, basestring):
+            if len(scope) != 1:
+                self.log('Multiple config scopes, using full running-config')
+                return None
+            scope = scope[0]
+        return scope or None
+
+    def load_scoped_config(self):
+        """Loads a scoped running-config into the node for instance lookups
+
+        Modules can define a config_scope function that returns the
+        running-config scope (or list of scopes) needed to build the
+        instance.  When exactly one scope is returned, only that section
+        is fetched from the node and cached as the node running-config so
+        the pyeapi resource getters parse it instead of the full config.
+        Multiple scopes, no scope or a failed scoped fetch fall back to the
+        full running-config.
+
+        """
+        if self._node._running_config is not None:
+            return
+
+        scope = self.resource_scope()
+        if not scope:
+            return
+
+        try:
+            self._node._running_config = self.scoped_config(scope)
+        except (pyeapi.eapilib.ConnectionError, pyeapi.eapilib.CommandError):
+            self.log('Unable to load config scope %s, using full '
+                     'running-config' % scope)
+        else:
+            self.log('Loaded running-config scope %s' % scope)
+
+    def config_checksum(self):
+        """Returns the running-config checksum reported by the node
+
+        Returns:
+            str: The checksum output or None if the node does not support
+                the checksum command
+
+        """
+        try:
+            resp = self.node.run_commands(CONFIG_CHECKSUM_COMMAND, 'text')
+        except (pyeapi.eapilib.ConnectionError, pyeapi.eapilib.CommandError):
+            self.log('Unable to retrieve the running-config checksum')
+            return None
+        return resp[0]['output'].strip() or None
+
+    def config_generation(self):
+        """Returns the config generation of the node
+
+        The generation is the running-config checksum, so it changes with
+        every configuration change on the node.
+
+        Returns:
+            str: The generation or None if the node does not report one
+
+        """
+        self._generation = self.config_checksum()
+        return self._generation
+
+    def load_config_cache(self):
+        """Loads the node running-config through the config cache
+
+        The config generation of the node is probed and, if it matches the
+        cache entry of the node, the cached running-config is used for all
+        resource lookups of the module.  Otherwise the running-config is
+        read from the node and stored in the cache with the generation so
+        the next module run against the node can reuse it.
+
+        """
+        name = self.params['host'] or self.params['connection']
+        cache = ConfigCache(self.params['config_cache'], name)
+
+        generation = self.config_generation()
+        if not generation:
+            return
+
+        config = cache.get(generation)
+        hit = config is not None
+        if not hit:
+            # The output is read directly since the pyeapi running_config
+            # property fails on non-ASCII text
+            try:
+                resp = self.node.run_commands('show running-config all',
+                                              'text')
+            except (pyeapi.eapilib.ConnectionError,
+                    pyeapi.eapilib.CommandError):
+                self.log('Unable to read the running-config')
+                return
+            config = resp[0]['output'].strip()
+            cache.set(generation, config)
+        self._node._running_config = config
+
+        self.result['config_cache'] = dict(hit=hit, generation=generation)
+        self.log('Config cache %s for generation %s' %
+                 ('hit' if hit else 'miss', generation))
+
+    def section_digest(self):
+        """Returns the digest of the resource running-config section
+        """
+        scope = self.resource_scope()
+        if not scope:
+            return None
+        try:
+            config = self.scoped_config(scope)
+        except (pyeapi.eapilib.ConnectionError, pyeapi.eapilib.CommandError):
+            return None
+        if isinstance(config, unicode):
+            config = config.encode('utf-8')
+        return hashlib.sha1(config).hexdigest()
+
+    def desired_digest(self):
+        """Returns the digest of the desired state of the resource
+
+        The digest covers the module name, the connection identity and the
+        attributes, so resources managed by different modules or on
+        different nodes never share a digest even when their attributes
+        are identical.
+
+        """
+        connection = dict([(key, self.params[key]) for key in
+                           ['connection', 'host', 'port', 'transport']])
+        state = json.dumps(dict(module=self.module_name,
+                                connection=connection,
+                                attributes=self.attributes),
+                           sort_keys=True, default=str)
+        return hashlib.sha1(state).hexdigest()
+
+    def check_digest_cache(self):
+        """Checks the digest cache for a converged resource
+
+        The resource is reported as converged, without calling instance,
+        when an entry exists for the desired state digest and either the
+        node config checksum or the resource config section digest is
+        unchanged since the last successful converge.
+
+        Returns:
+            bool: True if the resource is known to be converged
+
+        """
+        if not self.params['digest_cache'] or self.params['snapshot']:
+            return False
+
+        if self._stateful and self.desired_state not in ['present', 'absent']:
+            return False
+
+        name = self.params['host'] or self.params['connection']
+        self._digest_cache = DigestCache(self.params['digest_cache'], name)
+
+        self._desired_digest = self.desired_digest()
+        self._checksum = self._generation or self.config_checksum()
+        self._section_digest = None
+
+        hit = False
+        entry = self._digest_cache.get(self._desired_digest)
+        if entry:
+            if self._checksum and entry['checksum'] == self._checksum:
+                hit = True
+            else:
+                self._section_digest = self.section_digest()
+                hit = bool(self._section_digest and
+                           entry['section'] == self._section_digest)
+
+        self._digest_cache.record(hit)
+        self.result['digest_cache'] = self._digest_cache.summary(hit)
+        self.log('Digest cache %s for %s' % ('hit' if hit else 'miss',
+                                             self._desired_digest))
+
+        if hit:
+            entry['checksum'] = self._checksum
+            self._digest_cache.save()
+        return hit
+
+    def update_digest_cache(self):
+        """Stores the digests of the converged resource in the cache
+        """
+        if not self._digest_cache or self.check_mode:
+            return
+
+        checksum = self._checksum
+        section = self._section_digest
+        if self.result['changed']:
+            checksum = self.config_checksum()
+            section = None
+
+        if section is None:
+            section = self.section_digest()
+
+        self._digest_cache.set(self._desired_digest, checksum=checksum,
+                               section=section)
+        self._digest_cache.save()
+
+    @property
+    def module_name(self):
+        """Returns the name of the module from its DOCUMENTATION
+        """
+        match = MODULE_NAME_RE.search(globals().get('DOCUMENTATION', ''))
+        return match.group(1) if match else None
+
     def check_pyeapi(self):
         if not PYEAPI_AVAILABLE:
             self.fail('Unable to import pyeapi, is it installed?')
@@ -299,34 +1127,62 @@ class EosAnsibleModule(AnsibleModule):
     def validate(self):
         for key, value in self.attributes.iteritems():
             func = self.func('validate_%s' % key)
+            if not func:
+                func = self.schema.get(key, dict()).get('normalize')
             if func:
                 self.attributes[key] = func(value)
 
     def create(self):
-        if not self.check_mode:
-            func = self.func('create')
-            if not func:
-                self.fail('Module must define "create" function')
-            return self.invoke(func, self)
+        func = self.func('create')
+        if not func:
+            self.fail('Module must define "create" function')
+        return self.invoke(func, self)
+
+    def created_instance(self):
+        """Returns the predicted instance of the resource after create
+
+        A module can define a created function returning the attributes
+        set by its create commands, including the defaults the node assigns
+        to a new resource, so check mode and snapshot runs send the same
+        commands as a real run.  The other attributes keep the values of the
+        absent instance.
+        """
+        instance = dict(self.instance, state='present')
+        func = self.func('created')
+        if func:
+            instance.update(self.invoke(func, self))
+        return instance
 
     def remove(self):
-        if not self.check_mode:
-            func = self.func('remove')
-            if not func:
-                self.fail('Module most define "remove" function')
-            return self.invoke(func, self)
+        func = self.func('remove')
+        if not func:
+            self.fail('Module most define "remove" function')
+        return self.invoke(func, self)
 
     def flush(self, exit_after_flush=False):
         self.exit_after_flush = exit_after_flush
 
+        if self.check_digest_cache():
+            if self.exit_after_flush:
+                self.exit()
+            return
+
+        before = dict(self.instance)
+
         if self.desired_state == 'present' or not self._stateful:
             if self.instance.get('state') == 'absent':
                 changed = self.create()
                 self.result['changed'] = changed or True
-                self.refresh()
-                # After a create command, flush the running-config
-                # so we get the latest for any other attributes
-                self._node._running_config = None
+                if self.check_mode or self.params['snapshot']:
+                    # Nothing was created in check mode or on a snapshot
+                    # so the attributes are compared against the instance
+                    # predicted after create
+                    self._instance = self.created_instance()
+                else:
+                    self.refresh()
+                    # After a create command, flush the running-config
+                    # so we get the latest for any other attributes
+                    self._node._running_config = None
 
             changeset = self.attributes.viewitems() - self.instance.viewitems()
 
@@ -340,28 +1196,44 @@ class EosAnsibleModule(AnsibleModule):
                 self.result['changed'] = True
 
             self._attributes.update(changes)
+            predicted = dict(self.instance, **changes)
 
             flush = self.func('flush')
             if flush:
                 self.invoke(flush, self)
 
         elif self.desired_state == 'absent' and self._stateful:
+            predicted = dict(self.instance, state='absent')
             if self.instance.get('state') == 'present':
                 changed = self.remove()
                 self.result['changed'] = changed or True
 
         elif self._stateful:
+            predicted = dict(self.instance, state=self.desired_state)
             if self.desired_state != self.instance.get('state'):
                 func = self.func(self.desired_state)
                 changed = self.invoke(func, self)
                 self.result['changed'] = changed or True
 
-        self.refresh()
-        # By calling self.instance here we trigger another show running-config
-        # all which causes delay.  Only if debug is enabled do we call this
-        # since it will display the latest state of the object.
-        if self._debug:
-            self.result['instance'] = self.instance
+        if getattr(self, '_diff', False) and self.result['changed']:
+            # The after state is predicted from the instance read before
+            # the changes so diff mode does not read the resource again
+            self.result['diff'] = dict(before=before, after=predicted)
+
+        if self.check_mode:
+            # The predicted instance is the current instance with the
+            # changes applied, the node config was never changed
+            self.result['instance'] = predicted
+        else:
+            self.refresh()
+            # By calling self.instance here we trigger another show
+            # running-config all which causes delay.  Only if debug is
+            # enabled do we call this since it will display the latest
+            # state of the object.
+            if self._debug:
+                self.result['instance'] = self.bound('instance', self.instance)
+
+        self.update_digest_cache()
 
         if self.exit_after_flush:
             self.exit()
@@ -370,16 +1242,82 @@ class EosAnsibleModule(AnsibleModule):
         changes = dict()
         for key, value in changeset:
             if value is not None:
+                compare = self.schema.get(key, dict()).get('compare')
+                if compare and compare(value, self.instance.get(key)):
+                    continue
                 changes[key] = value
+                if key in self.schema:
+                    continue
                 func = self.func('set_%s' % key)
-                if func and not self.check_mode:
+                if func:
                     try:
                         self.invoke(func, self)
                     except Exception as exc:
                         self.fail(exc.message)
+
+        commands = self.render(changes)
+        if commands:
+            self.log('Sending commands %s' % commands)
+            try:
+                self.node.config(commands)
+            except Exception as exc:
+                self.fail(exc.message)
         return changes
 
-    def connect(self):
+    def render(self, changes):
+        """Renders the commands for the changed schema attributes
+
+        The commands are prefixed with the configuration mode returned by
+        the config_block function of the module, if it defines one.
+
+        Args:
+            changes (dict): The changed attributes and their desired values
+
+        Returns:
+            list: The commands to send to the node, or an empty list if no
+                schema attribute changed
+
+        """
+        commands = list()
+        for key, spec in self.schema.items():
+            if key not in changes:
+                continue
+            value = changes[key]
+            template = spec.get('command')
+            if callable(template):
+                commands.extend(template(self, value, self.instance.get(key)))
+                continue
+            if value is False or value == '' or \
+                    ('default' in spec and value == spec['default']):
+                template = spec.get('negate', template)
+            commands.append(template.format(value=value, **self.attributes))
+
+        if commands:
+            block = self.func('config_block')
+            if block:
+                commands.insert(0, self.invoke(block, self))
+        return commands
+
+    def replay_connection(self):
+        """Returns the connection replaying the recorded eAPI requests
+        """
+        latency = self.params['replay_latency']
+        if latency not in REPLAY_LATENCY:
+            try:
+                float(latency)
+            except ValueError:
+                self.fail('replay_latency must be one of %s or a number of '
+                          'milliseconds' % ', '.join(REPLAY_LATENCY))
+        try:
+            return ReplayConnection(self.params['replay'], latency,
+                                    mask=self.mask)
+        except (IOError, ValueError) as exc:
+            self.fail('unable to load replay fixture %s: %s' %
+                      (self.params['replay'], exc))
+
+    def make_connection(self):
+        """Returns the pyeapi connection and the connection settings
+        """
         if self.params['config']:
             pyeapi.load_config(self.params['config'])
 
@@ -410,6 +1348,25 @@ class EosAnsibleModule(AnsibleModule):
             self.fail('Connection must define a transport')
 
         connection = pyeapi.client.make_connection(**config)
+        if self.params['record']:
+            connection = RecordingConnection(connection, self.params['record'],
+                                             mask=self.mask)
+            self.log('Recording eAPI requests to %s' % connection.filename)
+
+        return (connection, config)
+
+    def connect(self):
+        if self.params['replay']:
+            connection = self.replay_connection()
+            config = dict()
+            self.log('Replaying eAPI requests from %s' % connection.filename)
+        else:
+            (connection, config) = self.make_connection()
+
+        if self.check_mode:
+            connection = DryRunConnection(connection)
+            self.log('Check mode, configuration requests are not sent')
+
         self.log('Creating connection with autorefresh=%s' % self._autorefresh)
         node = pyeapi.client.Node(connection, autorefresh=self._autorefresh,
                                   **config)
@@ -426,10 +1383,40 @@ class EosAnsibleModule(AnsibleModule):
 
         return node
 
+    def load_snapshot(self):
+        """Returns a node that answers from a running-config snapshot
+
+        No connection is made to the node.  The configuration commands sent
+        by the module are collected by the snapshot connection and returned
+        as the commands key of the module result.
+
+        """
+        filename = self.params['snapshot']
+        try:
+            connection = SnapshotConnection(filename)
+        except (IOError, ValueError) as exc:
+            self.fail('unable to load snapshot %s: %s' % (filename, exc))
+
+        self.log('Loaded running-config snapshot %s' % filename)
+        self.debug('node', str(connection))
+        return pyeapi.client.Node(connection, autorefresh=self._autorefresh)
+
+    def enable(self, commands, encoding='json'):
+        """Sends the list of enable commands to the node in one request
+
+        Args:
+            commands (list): The show commands to send to the node
+            encoding (str): The requested encoding of the command output
+
+        Returns:
+            list: The result of each command in the order it was sent
+
+        """
+        return self.node.run_commands(commands, encoding)
+
     def config(self, commands):
         self.result['changed'] = True
-        if not self.check_mode:
-            self.node.config(commands)
+        self.node.config(commands)
 
     def api(self, module):
         return self.node.api(module)
@@ -455,17 +1442,175 @@ class EosAnsibleModule(AnsibleModule):
 
     def exit(self):
         self.invoke_function('on_exit', self)
+        if self.params['snapshot']:
+            self.result['commands'] = self.node.connection.commands
+        elif self.params['replay']:
+            self.result['replay'] = self.node.connection.summary()
+        elif self.params['record']:
+            requests = self.node.connection.requests
+            self.result['record'] = dict(requests=requests)
+        if self.check_mode and not self.params['snapshot']:
+            self.result['commands'] = self.node.connection.commands
         self.log('Module completed successfully')
         self.exit_json(**self.result)
 
     def refresh(self):
-        self._instance = None
+        # A snapshot is never changed by the module so the instance read
+        # before any configuration stays valid for the rest of the run
+        if not self.params['snapshot']:
+            self._instance = None
 
     def debug(self, key, value):
         if self._debug:
             if 'debug' not in self.result:
                 self.result['debug'] = dict()
-            self.result['debug'][key] = value
+            self.result['debug'][key] = self.bound(key, value)
+
+    def bound(self, key, value):
+        """Caps the size of a debug value returned in the module result
+
+        Values that serialize to more than debug_max_size bytes are replaced
+        by their size, their sha1 digest and a copy truncated to
+        debug_max_size bytes.  A debug_max_size of 0 keeps only the size and
+        digest and a negative value disables the cap.  When debug_dest is
+        set the full value is written to a file in that directory named
+        after the key and digest, and the path is returned as well.  The
+        values of no_log arguments are masked first and the value is
+        measured, hashed and written as UTF-8.
+        """
+        value = self.mask(value)
+        if isinstance(value, basestring):
+            text = value
+        else:
+            text = json.dumps(value, sort_keys=True, default=str)
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+
+        limit = self.params['debug_max_size']
+        if limit < 0 or len(text) <= limit:
+            return value
+
+        digest = hashlib.sha1(text).hexdigest()
+        bounded = dict(size=len(text), sha1=digest)
+        if limit:
+            # A multibyte character cut by the limit is dropped
+            bounded['truncated'] = text[:limit].decode('utf-8', 'ignore') + \
+                DEBUG_TRUNCATED % (len(text) - limit)
+
+        dest = self.params['debug_dest']
+        if dest:
+            path = os.path.join(dest, '%s-%s' % (key, digest))
+            if not os.path.exists(path):
+                with self.private_file(path) as fh:
+                    fh.write(text)
+            bounded['path'] = path
+        return bounded
+
+    def private_file(self, path):
+        """Opens a new file only readable by its owner for writing
+
+        The debug and result files can hold the running-config and secret
+        hashes, so a missing parent directory is created only accessible
+        by its owner as well.
+        """
+        dirname = os.path.dirname(path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname, 0700)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+        return os.fdopen(fd, 'wb')
+
+    def mask(self, value):
+        """Returns the value with the values of no_log arguments masked
+
+        Values of types unknown to remove_values are masked as JSON text.
+        """
+        no_log_values = getattr(self, 'no_log_values', None)
+        if not no_log_values:
+            return value
+        try:
+            return remove_values(value, no_log_values)
+        except TypeError:
+            text = json.dumps(value, sort_keys=True, default=str)
+            return remove_values(text, no_log_values)
+
+    def spill(self, value, dest, compress=False):
+        """Writes a result value to a content addressed file
+
+        The value is serialized as JSON and written to a file in the dest
+        directory named after the sha1 digest of the JSON, with a .gz suffix
+        when compressed.  A file that already exists is not written again
+        and new files are only readable by their owner.
+
+        Returns:
+            dict: The path, the size of the file in bytes and the sha1
+                digest of the uncompressed JSON
+
+        """
+        text = json.dumps(self.mask(value), sort_keys=True)
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        digest = hashlib.sha1(text).hexdigest()
+        path = os.path.join(dest, '%s.json%s' % (digest,
+                                                 '.gz' if compress else ''))
+        if not os.path.exists(path):
+            tmpfile = '%s.%s' % (path, os.getpid())
+            with self.private_file(tmpfile) as fh:
+                if compress:
+                    gz = gzip.GzipFile(fileobj=fh, mode='wb', mtime=0)
+                    gz.write(text)
+                    gz.close()
+                else:
+                    fh.write(text)
+            os.rename(tmpfile, path)
+        return dict(path=path, size=os.path.getsize(path), sha1=digest,
+                    compressed=compress)
+
+    def select(self, value, pointer):
+        """Returns the part of a value addressed by a JSON pointer
+
+        Supports the RFC 6901 syntax, for instance /0/result/version or
+        /interfaces/Ethernet1~11/mtu where ~1 stands for / and ~0 for ~.
+
+        Returns:
+            object: The addressed value or None if it does not exist
+
+        """
+        if pointer in ['', '/']:
+            return value
+        for token in pointer.lstrip('/').split('/'):
+            token = token.replace('~1', '/').replace('~0', '~')
+            try:
+                if isinstance(value, list):
+                    value = value[int(token)]
+                else:
+                    value = value[token]
+            except (KeyError, IndexError, ValueError, TypeError):
+                return None
+        return value
+
+    def reduce_result(self, value):
+        """Applies the result_dest and result_select options to a value
+
+        With result_dest the full value is written to a file (see spill)
+        and the path, size and digest are stored in result_file.  With
+        result_select only the parts of the value addressed by the comma
+        delimited JSON pointers are kept, keyed by pointer.
+
+        Returns:
+            object: The value to return in the module result or None if
+                the value was only written to a file
+
+        """
+        dest = self.params.get('result_dest')
+        if dest:
+            compress = self.boolean(self.params.get('result_compress'))
+            self.result['result_file'] = self.spill(value, dest, compress)
+
+        pointers = self.params.get('result_select')
+        if pointers:
+            pointers = [p.strip() for p in pointers.split(',')]
+            return dict([(p, self.select(value, p)) for p in pointers])
+        return None if dest else value
 
     def log(self, message, log_args=None, priority=None):
         if self._logging:
@@ -479,45 +1624,653 @@ class EosAnsibleModule(AnsibleModule):
 
 #<<EOS_COMMON_MODULE_END>>
 
+STANDARD_ENTRY_RE = re.compile(r'^\s*(\d+) (permit|deny) '
+                               r'(any|host (\S+)|(\S+)/(\d+)|(\S+) (\S+))'
+                               r'( log)?\s*$')
+REMARK_RE = re.compile(r'^\s*(\d+) remark (.*?)\s*$')
+ACCESS_GROUP_RE = r'^\s+ip access-group %s(?: (.*?))?\s*$'
+SEQNO_RE = re.compile(r'^\s*\d+ ')
+SWAP_SUFFIX = '_swap'
+MASKS = [(0xffffffff << (32 - length)) & 0xffffffff for length in range(33)]
+
+# Number of values taken by each port operator, None for a list of ports
+PORT_OPERATORS = {'eq': None, 'neq': None, 'gt': 1, 'lt': 1, 'range': 2}
+
+# Port numbers of the well-known port names shown by EOS
+PORT_NUMBERS = {
+    'echo': '7', 'discard': '9', 'daytime': '13', 'chargen': '19',
+    'ftp-data': '20', 'ftp': '21', 'ssh': '22', 'telnet': '23', 'smtp': '25',
+    'time': '37', 'nameserver': '42', 'whois': '43', 'tacacs': '49',
+    'domain': '53', 'bootps': '67', 'bootpc': '68', 'tftp': '69',
+    'gopher': '70', 'finger': '79', 'www': '80', 'hostname': '101',
+    'pop2': '109', 'pop3': '110', 'sunrpc': '111', 'ident': '113',
+    'nntp': '119', 'ntp': '123', 'netbios-ns': '137', 'netbios-dgm': '138',
+    'netbios-ss': '139', 'imap4': '143', 'snmp': '161', 'snmptrap': '162',
+    'xdmcp': '177', 'bgp': '179', 'irc': '194', 'dnsix': '195',
+    'ldap': '389', 'mobile-ip': '434', 'https': '443', 'pim-auto-rp': '496',
+    'isakmp': '500', 'biff': '512', 'exec': '512', 'login': '513',
+    'who': '513', 'cmd': '514', 'syslog': '514', 'lpd': '515', 'talk': '517',
+    'rip': '520', 'uucp': '540', 'klogin': '543', 'kshell': '544',
+    'ldaps': '636', 'radius': '1812', 'radius-acct': '1813',
+}
+
+# Keywords ending a list of ports in an extended entry
+ENTRY_KEYWORDS = frozenset(['any', 'host', 'log', 'established', 'fragments',
+                            'syn', 'ack', 'fin', 'psh', 'rst', 'urg', 'ttl',
+                            'dscp', 'tracked'])
+
+# Options that only apply to the entries mode
+AGGREGATE_ARGS = ['entries', 'replace', 'optimize', 'replace_method']
+
+def config_scope(module):
+    """ Returns the running-config scope for the access list
+    """
+    return 'section ^%s$' % acl_header(module)
+
+def acl_header(module, name=None):
+    """ Returns the access list configuration mode command
+    """
+    name = name or module.attributes['name']
+    if module.attributes['acltype'] == 'extended':
+        return 'ip access-list %s' % name
+    return 'ip access-list standard %s' % name
+
+def ip_to_int(addr):
+    return struct.unpack('!L', socket.inet_aton(addr))[0]
+
+def int_to_ip(value):
+    return socket.inet_ntoa(struct.pack('!L', value))
+
+def network(addr, prefixlen):
+    """ Returns the network address of addr for the prefix length
+    """
+    return int_to_ip(ip_to_int(addr) & MASKS[prefixlen])
+
+def wildcard_to_prefixlen(wildcard):
+    return 32 - bin(ip_to_int(wildcard)).count('1')
+
+def parse_address(tokens, index):
+    """ Parses the address starting at tokens[index]
+
+    Returns:
+        tuple: The network address, the prefix length and the index of the
+            token following the address
+
+    """
+    token = tokens[index]
+    if token == 'any':
+        return ('0.0.0.0', 0, index + 1)
+    elif token == 'host':
+        return (tokens[index + 1], 32, index + 2)
+    elif '/' in token:
+        (addr, prefixlen) = token.split('/')
+        prefixlen = int(prefixlen)
+        return (network(addr, prefixlen), prefixlen, index + 1)
+    prefixlen = wildcard_to_prefixlen(tokens[index + 1])
+    return (network(token, prefixlen), prefixlen, index + 2)
+
+def parse_ports(tokens, index):
+    """ Parses the optional port match starting at tokens[index]
+
+    Returns:
+        tuple: The port match, for instance "eq www https", or None and the
+            index of the token following the port match
+
+    """
+    if index >= len(tokens) or tokens[index] not in PORT_OPERATORS:
+        return (None, index)
+    count = PORT_OPERATORS[tokens[index]]
+    end = index + 1
+    if count:
+        end += count
+    else:
+        while end < len(tokens) and tokens[end] not in ENTRY_KEYWORDS and \
+                '.' not in tokens[end]:
+            end += 1
+    return (normalize_ports(' '.join(tokens[index:end])), end)
+
+def normalize_ports(ports):
+    """ Returns the port match with the well-known port names numbered
+
+    EOS shows the well-known ports by name whether they were configured
+    by name or by number, so port matches are compared by number.
+    """
+    if not ports:
+        return ports
+    return ' '.join([PORT_NUMBERS.get(t, t) for t in ports.split()])
+
+def parse_extended_entry(line):
+    """ Parses an extended access list entry
+
+    The entry is split in its protocol, source, source ports, destination,
+    destination ports and log keyword.  Any other keyword following the
+    destination, such as the TCP flags, is kept in flags.
+    """
+    tokens = line.split()
+    if len(tokens) < 5 or not tokens[0].isdigit() or \
+            tokens[1] not in ['permit', 'deny']:
+        return None
+    try:
+        (srcaddr, srcprefixlen, index) = parse_address(tokens, 3)
+        (srcport, index) = parse_ports(tokens, index)
+        (dstaddr, dstprefixlen, index) = parse_address(tokens, index)
+        (dstport, index) = parse_ports(tokens, index)
+    except (IndexError, ValueError, socket.error):
+        return None
+    flags = tokens[index:]
+    log = 'log' in flags
+    if log:
+        flags.remove('log')
+    return dict(seqno=int(tokens[0]), action=tokens[1], protocol=tokens[2],
+                srcaddr=srcaddr, srcprefixlen=srcprefixlen, srcport=srcport,
+                dstaddr=dstaddr, dstprefixlen=dstprefixlen, dstport=dstport,
+                flags=' '.join(flags) or None, log=log)
+
+def parse_entry(line, acltype='standard'):
+    """ Parses an access list entry from the running-config
+
+    Returns:
+        dict: The entry with its seqno, action, srcaddr, srcprefixlen and
+            log keys, plus the protocol, dstaddr, dstprefixlen, srcport,
+            dstport and flags keys for an extended entry, or seqno and
+            remark keys for a remark, or None if the line is not an entry
+
+    """
+    match = REMARK_RE.match(line)
+    if match:
+        return dict(seqno=int(match.group(1)), remark=match.group(2))
+
+    if acltype == 'extended':
+        return parse_extended_entry(line)
+
+    match = STANDARD_ENTRY_RE.match(line)
+    if not match:
+        return None
+    (seqno, action, _, host, addr, prefixlen, wcaddr, wildcard, log) = \
+        match.groups()
+    if match.group(3) == 'any':
+        (addr, prefixlen) = ('0.0.0.0', 0)
+    elif host:
+        (addr, prefixlen) = (host, 32)
+    elif wcaddr:
+        (addr, prefixlen) = (wcaddr, wildcard_to_prefixlen(wildcard))
+    prefixlen = int(prefixlen)
+    return dict(seqno=int(seqno), action=action,
+                srcaddr=network(addr, prefixlen), srcprefixlen=prefixlen,
+                log=log is not None)
+
+def render_address(addr, prefixlen):
+    if prefixlen == 0:
+        return 'any'
+    elif prefixlen == 32:
+        return 'host %s' % addr
+    return '%s/%s' % (addr, prefixlen)
+
+def render_entry(entry):
+    """ Returns the configuration command for an access list entry
+    """
+    if 'remark' in entry:
+        return '%s remark %s' % (entry['seqno'], entry['remark'])
+
+    tokens = [str(entry['seqno']), entry['action']]
+    if 'protocol' in entry:
+        tokens.append(entry['protocol'])
+    tokens.append(render_address(entry['srcaddr'], entry['srcprefixlen']))
+    if 'protocol' in entry:
+        if entry['srcport']:
+            tokens.append(entry['srcport'])
+        tokens.append(render_address(entry['dstaddr'],
+                                     entry['dstprefixlen']))
+        if entry['dstport']:
+            tokens.append(entry['dstport'])
+        if entry['flags']:
+            tokens.append(entry['flags'])
+    if entry['log']:
+        tokens.append('log')
+    return ' '.join(tokens)
+
+def make_entry(module, item):
+    """ Returns the entry described by a dict of entry keys
+
+    Missing keys take their default value, the addresses are reduced to
+    their network address, the port names are numbered and the whitespace
+    of the port matches and flags is collapsed so the entry compares equal
+    to the entry parsed from the node.
+    """
+    def value(key, default=None):
+        return default if item.get(key) is None else item[key]
+
+    def words(key):
+        return ' '.join(str(value(key, '')).split()) or None
+
+    seqno = int(item['seqno'])
+    if 'remark' in item:
+        return dict(seqno=seqno, remark=item['remark'])
+
+    action = value('action', 'deny')
+    if action not in ['permit', 'deny']:
+        raise ValueError('invalid action %s' % action)
+    prefixlen = int(value('srcprefixlen', 32))
+    entry = dict(seqno=seqno, action=action,
+                 srcaddr=network(item['srcaddr'], prefixlen),
+                 srcprefixlen=prefixlen,
+                 log=module.boolean(value('log', False)))
+
+    if module.attributes['acltype'] == 'extended':
+        prefixlen = int(value('dstprefixlen', 32))
+        entry.update(protocol=str(value('protocol', 'ip')),
+                     dstaddr=network(item['dstaddr'], prefixlen),
+                     dstprefixlen=prefixlen,
+                     srcport=normalize_ports(words('srcport')),
+                     dstport=normalize_ports(words('dstport')),
+                     flags=words('flags'))
+    return entry
+
+def acl_entries(module):
+    """ Returns the current entries of the access list keyed by seqno
+
+    The access list is read once from the running-config, using the
+    config scope of the module, and parsed locally.
+
+    Returns:
+        dict: The parsed entries or None if the access list does not exist
+
+    """
+    module.load_scoped_config()
+    config = module.api('acl').get_block(acl_header(module))
+    if config is None:
+        return None
+
+    entries = dict()
+    for line in config.split('\n')[1:]:
+        entry = parse_entry(line, module.attributes['acltype'])
+        if entry:
+            entries[entry['seqno']] = entry
+    return entries
+
+class PrefixSet(object):
+    """ Union of IPv4 prefixes kept aggregated
+
+    Sibling prefixes are replaced by their parent as they are added, so a
+    prefix is covered by the union only if it or one of its parents is in
+    the set.  Lookups only probe the prefix lengths present in the set.
+    """
+
+    def __init__(self):
+        self.prefixes = set()
+        self.lengths = dict()
+
+    def covers(self, addr, prefixlen):
+        for length in self.lengths:
+            if length <= prefixlen and \
+                    (addr & MASKS[length], length) in self.prefixes:
+                return True
+        return False
+
+    def add(self, addr, prefixlen):
+        while prefixlen:
+            sibling = (addr ^ (1 << (32 - prefixlen)), prefixlen)
+            if sibling not in self.prefixes:
+                break
+            self.prefixes.remove(sibling)
+            self.lengths[prefixlen] -= 1
+            if not self.lengths[prefixlen]:
+                del self.lengths[prefixlen]
+            prefixlen -= 1
+            addr &= MASKS[prefixlen]
+        self.prefixes.add((addr, prefixlen))
+        self.lengths[prefixlen] = self.lengths.get(prefixlen, 0) + 1
+
+def mergeable(first, second):
+    """ Returns True if two entries match the halves of the same prefix
+    """
+    ((entry1, addr1, len1), (entry2, addr2, len2)) = (first[:3], second[:3])
+    return len1 == len2 and len1 > 0 and \
+        addr1 ^ addr2 == 1 << (32 - len1) and \
+        entry1['action'] == entry2['action'] and entry1['log'] == entry2['log']
+
+def optimize_entries(entries):
+    """ Finds the entries of an access list that can be removed or merged
+
+    Entries are evaluated in seqno order.  An entry whose source is covered
+    by the union of the earlier entries never matches and is removed,
+    either as a duplicate of an earlier entry or as shadowed.  Consecutive
+    entries left with the same action and log on sibling prefixes are
+    merged into their parent prefix, under the first seqno.  Remarks are
+    kept as is.
+
+    Args:
+        entries (dict): The entries keyed by seqno
+
+    Returns:
+        tuple: The minimized entries keyed by seqno and the report
+
+    """
+    covered = PrefixSet()
+    seen = set()
+    duplicates = list()
+    shadowed = list()
+    remarks = list()
+    stack = list()
+
+    for seqno in sorted(entries):
+        entry = entries[seqno]
+        if 'remark' in entry:
+            remarks.append(entry)
+            continue
+
+        addr = ip_to_int(entry['srcaddr'])
+        prefixlen = entry['srcprefixlen']
+        key = (entry['action'], addr, prefixlen, entry['log'])
+        if covered.covers(addr, prefixlen):
+            (duplicates if key in seen else shadowed).append(seqno)
+            continue
+        seen.add(key)
+        covered.add(addr, prefixlen)
+
+        stack.append([entry, addr, prefixlen, [seqno]])
+        while len(stack) > 1 and mergeable(stack[-2], stack[-1]):
+            (first, second) = (stack[-2], stack.pop())
+            first[2] -= 1
+            first[1] &= MASKS[first[2]]
+            first[3].extend(second[3])
+
+    optimized = dict((e['seqno'], e) for e in remarks)
+    merged = list()
+    for (entry, addr, prefixlen, seqnos) in stack:
+        if len(seqnos) > 1:
+            entry = dict(entry, srcaddr=int_to_ip(addr),
+                         srcprefixlen=prefixlen)
+            merged.append(dict(seqnos=seqnos, entry=render_entry(entry)))
+        optimized[entry['seqno']] = entry
+    report = dict(entries=len(entries) - len(remarks),
+                  optimized=len(stack), duplicates=duplicates,
+                  shadowed=shadowed, merged=merged)
+    return (optimized, report)
+
+def acl_options(module):
+    """ Returns the access list lines that are not entries
+
+    Returns:
+        tuple: The option lines, for instance "statistics per-entry", and
+            the numbered lines that are not parsed as entries
+
+    """
+    config = module.api('acl').get_block(acl_header(module)) or ''
+    (options, unparsed) = (list(), list())
+    for line in config.split('\n')[1:]:
+        if not line.strip() or line.strip() == '!':
+            continue
+        if not SEQNO_RE.match(line):
+            options.append(line.strip())
+        elif not parse_entry(line, module.attributes['acltype']):
+            unparsed.append(line.strip())
+    return (options, unparsed)
+
+def acl_bindings(module):
+    """ Returns the configuration modes the access list is applied in
+
+    Every ip access-group statement naming the access list is returned,
+    whatever the mode it is configured in, for instance an interface, the
+    control-plane or a management api vrf.
+
+    Returns:
+        list: The (modes, arguments) pairs in running-config order, where
+            modes is the tuple of mode commands entering the mode and
+            arguments follow the access list name, for instance "in"
+
+    """
+    name = module.attributes['name']
+    config = module.scoped_config('section ip access-group %s' % name)
+    regex = re.compile(ACCESS_GROUP_RE % re.escape(name))
+
+    bindings = list()
+    modes = list()
+    for line in config.split('\n'):
+        if not line.strip() or line.strip() in ['!', 'end']:
+            continue
+        indent = len(line) - len(line.lstrip())
+        while modes and modes[-1][0] >= indent:
+            modes.pop()
+        match = regex.match(line)
+        if match and modes:
+            bindings.append((tuple([m[1] for m in modes]),
+                             match.group(1) or ''))
+        else:
+            modes.append((indent, line.strip()))
+    return bindings
+
+def render_binding(binding):
+    (modes, args) = binding
+    return ('%s %s' % (' / '.join(modes), args)).strip()
+
+def rebind_commands(bindings, name):
+    """ Returns the commands applying name to each of the bindings
+    """
+    commands = list()
+    for (modes, args) in bindings:
+        commands.extend(modes)
+        commands.append(('ip access-group %s %s' % (name, args)).strip())
+        commands.extend(['exit'] * len(modes))
+    return commands
+
+def swap_name(module):
+    """ Returns a name for the temporary access list of a swap
+
+    The name is the access list name with SWAP_SUFFIX and, if an access
+    list of that name exists, a number so no other access list is
+    overwritten.
+    """
+    name = '%s%s' % (module.attributes['name'], SWAP_SUFFIX)
+    config = module.scoped_config('section ^%s' % acl_header(module, name))
+    headers = [l.strip() for l in config.split('\n')
+               if l.startswith('ip access-list ')]
+
+    swap = name
+    index = 1
+    while acl_header(module, swap) in headers or \
+            'ip access-list %s' % swap in headers:
+        swap = '%s%s' % (name, index)
+        index += 1
+    return swap
+
+def swap_commands(module, desired, bindings, options):
+    """ Returns the commands rebuilding the access list behind a swap
+
+    The entries are built under a temporary name and the bindings are
+    moved to it.  The access list is then rebuilt while it is not applied
+    anywhere, the bindings are moved back and the temporary access list is
+    removed.  The option lines of the access list are kept.
+    """
+    name = module.attributes['name']
+    swap = swap_name(module)
+    entries = list(options)
+    entries.extend([render_entry(desired[s]) for s in sorted(desired)])
+
+    commands = [acl_header(module, swap)]
+    commands.extend(entries)
+    commands.append('exit')
+    commands.extend(rebind_commands(bindings, swap))
+    commands.extend(['no %s' % acl_header(module), acl_header(module)])
+    commands.extend(entries)
+    commands.append('exit')
+    commands.extend(rebind_commands(bindings, name))
+    commands.append('no %s' % acl_header(module, swap))
+    return commands
+
+def desired_entries(module):
+    """ Returns the entries from the entries argument keyed by seqno
+    """
+    value = module.attributes['entries']
+    try:
+        if isinstance(value, basestring):
+            if value.strip().startswith('['):
+                value = module.from_json(value)
+            else:
+                value = value.split(',')
+        if not isinstance(value, list):
+            raise ValueError('entries must be a list')
+
+        entries = dict()
+        for item in value:
+            if isinstance(item, basestring):
+                entry = parse_entry(item, module.attributes['acltype'])
+                if not entry:
+                    raise ValueError('unable to parse entry %s' % item)
+            else:
+                entry = make_entry(module, item)
+            entries[entry['seqno']] = entry
+    except (KeyError, TypeError, ValueError, socket.error) as exc:
+        module.fail('invalid entries: %s' % exc)
+    return entries
+
+def converge(module):
+    """ Converges the access list to the entries argument in one request
+
+    Entries whose seqno is not configured or whose content differs are
+    (re)added.  With replace, entries not in the entries argument are
+    removed.  With state=absent the listed sequence numbers are removed.
+    The entries dropped or merged by the optimizer are always removed.
+    """
+    current = acl_entries(module)
+    existing = current or dict()
+    desired = desired_entries(module)
+    dropped = set()
+
+    if module.attributes['optimize'] != 'none' and \
+            module.attributes['state'] == 'present':
+        (optimized, report) = optimize_entries(desired)
+        module.result['optimizer'] = report
+        if module.attributes['optimize'] == 'apply':
+            dropped = set(desired) - set(optimized)
+            desired = optimized
+
+    if module.attributes['state'] == 'absent':
+        added = list()
+        removed = sorted([s for s in desired if s in existing])
+    else:
+        added = [s for s in sorted(desired) if existing.get(s) != desired[s]]
+        removed = [s for s in added if s in existing]
+        if module.attributes['replace']:
+            removed.extend([s for s in existing if s not in desired])
+        else:
+            removed.extend([s for s in dropped if s in existing])
+        removed.sort()
+
+    if added or removed or (current is None and desired and
+                            module.attributes['state'] == 'present'):
+        method = module.attributes['replace_method']
+        # the bindings are only read when a swap is requested
+        (bindings, checked) = (list(), False)
+        if current is not None and method == 'swap' and \
+                module.attributes['state'] == 'present':
+            (bindings, checked) = (module.invoke(acl_bindings, module), True)
+            (options, unparsed) = acl_options(module)
+            if unparsed and not module.attributes['replace']:
+                module.log('Entries %s are not parsed, using inplace' %
+                           ', '.join(unparsed))
+                method = 'inplace'
+        if not bindings:
+            method = 'inplace'
+
+        if method == 'swap':
+            # the swap rebuilds the whole access list, entries that are
+            # not managed are kept unless they are replaced
+            rebuilt = dict() if module.attributes['replace'] else \
+                dict((s, e) for (s, e) in existing.items()
+                     if s not in dropped)
+            rebuilt.update(desired)
+            removed = sorted([s for s in existing
+                              if rebuilt.get(s) != existing[s]])
+            commands = swap_commands(module, rebuilt, bindings, options)
+            # every binding is programmed for the temporary access list
+            # and again for the rebuilt one
+            events = 2 * len(bindings)
+        else:
+            commands = [acl_header(module)]
+            commands.extend(['no %s' % seqno for seqno in removed])
+            commands.extend([render_entry(desired[s]) for s in added])
+            commands.append('exit')
+            # a bound access list is reprogrammed for every edited entry,
+            # it is assumed to be bound unless the bindings were read
+            events = len(added) + len(removed)
+            if checked and not bindings:
+                events = 0
+
+        module.log('Invoked converge for eos_acl_entry[%s] with %s added '
+                   'and %s removed' % (module.attributes['name'], len(added),
+                                       len(removed)))
+        start = time.time()
+        module.invoke(module.config, commands)
+        module.result['push'] = dict(
+            method=method, time=round(time.time() - start, 4),
+            bindings=[render_binding(b) for b in bindings],
+            tcam_events=events)
+        module.result['changes'] = dict(
+            added=[render_entry(desired[s]) for s in added],
+            removed=removed)
+
+    module.exit()
+
+def validate_words(value):
+    """ Collapses the whitespace of port matches and flags
+    """
+    if value is None:
+        return None
+    return ' '.join(value.split()) or None
+
+def validate_ports(value):
+    """ Collapses the whitespace of port matches and numbers the port names
+    """
+    return normalize_ports(validate_words(value))
+
+validate_srcport = validate_dstport = validate_ports
+validate_flags = validate_words
+
 def instance(module):
-    """ Returns an instance of Vlan based on vlanid
+    """ Returns an instance of the access list entry based on seqno
     """
     seqno = module.attributes['seqno']
     aclname = module.attributes['name']
     _instance = dict(name=aclname, seqno=seqno, state='absent')
-    result = module.api('acl').get(aclname)
-    if result:
-        if seqno in result['entries']:
-            _instance['state'] = 'present'
-            _instance['acltype'] = result['type']
-            _instance['seqno'] = seqno
-            _instance['action'] = result['entries'][seqno]['action']
-            _instance['srcaddr'] = result['entries'][seqno]['srcaddr']
-            _instance['srcprefixlen'] = result['entries'][seqno]['srclen']
-            _instance['log'] = result['entries'][seqno]['log']
+    entry = (acl_entries(module) or dict()).get(seqno)
+    if entry and 'remark' not in entry:
+        _instance.update(entry)
+        _instance['state'] = 'present'
+        _instance['acltype'] = module.attributes['acltype']
     return _instance
 
 
 def create(module):
+    """ Creates the entry
+
+    The access list and the entry are configured by flush in the same
+    request so create only records the change.
+    """
     value = module.attributes['name']
     module.log('Invoked create for eos_acl_entry[%s]' % value)
-    module.api('acl').create(value)
+
+def created(module):
+    """ Returns the attributes of the entry set by create
+
+    The entry is only configured by flush so it is still absent.
+    """
+    return dict(state='absent')
 
 def remove(module):
     value = module.attributes['name']
     seqno = module.attributes['seqno']
     module.log('Invoked remove for eos_acl_entry[%s]' % value)
-    module.api('acl').remove_entry(value, seqno)
+    module.config([acl_header(module), 'no %s' % seqno, 'exit'])
 
 def flush(module):
-    args = list()
-    args.append(module.attributes['name'])
-    args.append(module.attributes['seqno'])
-    args.append(module.attributes['action'])
-    args.append(module.attributes['srcaddr'])
-    args.append(module.attributes['srcprefixlen'])
-    args.append(module.attributes['log'])
-    module.api('acl').update_entry(*args)
+    """ Replaces the entry if any of its attributes changed
+    """
+    if not module.result.get('changes'):
+        return
+    entry = make_entry(module, module.attributes)
+    module.config([acl_header(module), 'no %s' % entry['seqno'],
+                   render_entry(entry), 'exit'])
 
 def main():
     """ The main module routine called when the module is run by Ansible
@@ -526,19 +2279,43 @@ def main():
     argument_spec = dict(
         acltype=dict(required=True, choices=['standard', 'extended']),
         name=dict(required=True),
-        seqno=dict(required=True),
+        seqno=dict(type='int'),
         action=dict(default='deny', choices=['permit', 'deny']),
+        protocol=dict(),
         srcaddr=dict(),
         srcprefixlen=dict(type='int'),
-        log=dict(type='bool', default=False)
+        srcport=dict(),
+        dstaddr=dict(),
+        dstprefixlen=dict(type='int'),
+        dstport=dict(),
+        flags=dict(),
+        log=dict(type='bool', default=False),
+        entries=dict(),
+        replace=dict(type='bool', default=False),
+        optimize=dict(default='none', choices=['none', 'report', 'apply']),
+        replace_method=dict(default='inplace', choices=['inplace', 'swap'])
     )
 
     module = EosAnsibleModule(argument_spec=argument_spec,
+                              mutually_exclusive=[['seqno', 'entries']],
+                              required_one_of=[['seqno', 'entries']],
                               supports_check_mode=True)
 
-    if module.attributes['acltype'] == 'extended':
-        module.fail('Currently only standard ACLs are supported')
-
-    module.flush(True)
+    extended = module.attributes['acltype'] == 'extended'
+
+    if module.attributes['entries'] is not None:
+        if extended and module.attributes['optimize'] != 'none':
+            module.fail('optimize is only supported for standard ACLs')
+        converge(module)
+    else:
+        for key in AGGREGATE_ARGS:
+            del module.attributes[key]
+        if module.attributes['state'] == 'present':
+            required = ['srcaddr', 'dstaddr'] if extended else ['srcaddr']
+            missing = [k for k in required if module.attributes[k] is None]
+            if missing:
+                module.fail('missing required arguments: %s' %
+                            ', '.join(missing))
+        module.flush(True)
 
 main()
\ No newline at end of file
@@ -122,7 +122,15 @@ EXAMPLES = """
 """
 #<<EOS_COMMON_MODULE_START>>
 
+import io
+import os
+import re
+import gzip
+import json
+import mmap
+import time
 import syslog
+import hashlib
 import collections
 
 from ansible.module_utils.basic import *
@@ -136,6 +144,17 @@ except ImportError:
 DEFAULT_SYSLOG_PRIORITY = syslog.LOG_NOTICE
 DEFAULT_CONNECTION = 'localhost'
 TRANSPORTS = ['socket', 'http', 'https', 'http_local']
+READERS = ['config', 'json']
+REPLAY_LATENCY = ['none', 'recorded']
+CONFIG_CHECKSUM_COMMAND = 'show running-config checksum'
+RUNNING_CONFIG_RE = re.compile(r'^show running-config(?: all)?(?: (.+))?$')
+BLOCK_END_RE = re.compile(r'\n(?=\S)')
+INTERFACE_BLOCK_RE = re.compile(r'^interface (\S+)\n((?: .*\n)*)', re.M)
+PORT_CHANNEL_RE = re.compile(r'^show port-channel (\d+) all-ports$')
+MODULE_NAME_RE = re.compile(r'^module: (\S+)', re.M)
+DEBUG_MAX_SIZE = 4096
+DEBUG_TRUNCATED = '... [%s bytes truncated]'
+MASKED_INPUT = 'VALUE_SPECIFIED_IN_NO_LOG_PARAMETER'
 
 class EosConnection(object):
 
@@ -181,6 +200,384 @@ class EosConnection(object):
         return node
 
 
+class DigestCache(object):
+    """Control node cache of resource digests from the last converge
+
+    Each entry is keyed by the digest of the desired state of a resource and
+    holds the config checksum of the node and the digest of the resource
+    config section observed after the last successful converge.  Entries
+    and hit statistics are stored as one JSON file per node so concurrent
+    tasks against different nodes never write the same file.
+
+    Args:
+        path (str): The directory used to store the cache files
+        name (str): The name of the node the cache file belongs to
+
+    """
+
+    def __init__(self, path, name):
+        self.filename = os.path.join(os.path.expanduser(path),
+                                     '%s.json' % name)
+        self.entries = dict()
+        self.stats = dict(hits=0, misses=0)
+        self.load()
+
+    def load(self):
+        try:
+            data = json.load(open(self.filename))
+        except (IOError, ValueError):
+            return
+        self.entries = data.get('entries', dict())
+        self.stats.update(data.get('stats', dict()))
+
+    def save(self):
+        dirname = os.path.dirname(self.filename)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        tmpfile = '%s.%s' % (self.filename, os.getpid())
+        with open(tmpfile, 'w') as fh:
+            json.dump(dict(entries=self.entries, stats=self.stats), fh)
+        os.rename(tmpfile, self.filename)
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, **kwargs):
+        self.entries[key] = kwargs
+
+    def record(self, hit):
+        self.stats['hits' if hit else 'misses'] += 1
+
+    def summary(self, hit):
+        total = self.stats['hits'] + self.stats['misses']
+        rate = float(self.stats['hits']) / total if total else 0.0
+        return dict(hit=hit, hits=self.stats['hits'],
+                    misses=self.stats['misses'], hit_rate=round(rate, 4))
+
+
+class ConfigCache(object):
+    """Control node cache of the last running-config read from a node
+
+    The running-config is stored with the config generation of the node,
+    the running-config checksum observed just before it was read.  A module
+    that observes the same generation reuses the stored running-config
+    instead of reading it from the node.  The cache is stored as one file
+    per node holding the generation on the first line.  The running-config
+    includes secrets so the file is only readable by its owner.  The file
+    is encoded as UTF-8.
+
+    Args:
+        path (str): The directory used to store the cache files
+        name (str): The name of the node the cache file belongs to
+
+    """
+
+    def __init__(self, path, name):
+        self.filename = os.path.join(os.path.expanduser(path),
+                                     '%s.config' % name)
+
+    def get(self, generation):
+        """Returns the cached running-config if the generation matches
+        """
+        try:
+            with io.open(self.filename, encoding='utf-8') as fh:
+                if fh.readline().rstrip('\n') != generation:
+                    return None
+                return fh.read()
+        except IOError:
+            return None
+
+    def set(self, generation, config):
+        dirname = os.path.dirname(self.filename)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname, 0700)
+        tmpfile = '%s.%s' % (self.filename, os.getpid())
+        fd = os.open(tmpfile, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+        with io.open(fd, 'w', encoding='utf-8') as fh:
+            fh.write(u'%s\n%s' % (generation, config))
+        os.rename(tmpfile, self.filename)
+
+
+class SnapshotConnection(object):
+    """Answers eAPI requests from a saved running-config file
+
+    The connection stands in for a pyeapi connection so a pyeapi Node built
+    on it serves the resource getters from the snapshot without any network
+    I/O.  The file is memory mapped and scoped running-config requests only
+    copy the matching sections, port-channel members are read from the
+    channel-group lines.  Configuration commands are not applied, they are
+    recorded in the commands attribute in the order they would have been
+    sent.
+
+    Args:
+        filename (str): The path to the saved "show running-config all"
+            output
+
+    """
+
+    def __init__(self, filename):
+        self.filename = os.path.expanduser(filename)
+        self.commands = list()
+        with open(self.filename) as fh:
+            self.config = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __str__(self):
+        return 'SnapshotConnection(filename=%s)' % self.filename
+
+    def execute(self, commands, encoding='json'):
+        results = list()
+        configure = False
+        for command in commands:
+            if isinstance(command, dict):
+                command = command['cmd']
+            if command in ['configure', 'configure terminal']:
+                configure = True
+                results.append(dict())
+            elif command == 'enable':
+                results.append(dict())
+            elif configure:
+                self.commands.append(command)
+                results.append(dict())
+            else:
+                results.append(self.show(command, encoding))
+        return dict(jsonrpc='2.0', result=results, id=id(self))
+
+    def show(self, command, encoding):
+        match = PORT_CHANNEL_RE.match(command)
+        if match and encoding == 'text':
+            return dict(output=self.port_channel(match.group(1)))
+
+        match = RUNNING_CONFIG_RE.match(command)
+        if not match:
+            raise pyeapi.eapilib.CommandError(1002, 'not available in '
+                                              'snapshot',
+                                              command_error=command)
+        if encoding != 'text':
+            raise pyeapi.eapilib.CommandError(1003, 'not supported in JSON '
+                                              'format')
+
+        scope = match.group(1)
+        if not scope:
+            output = self.config[:]
+        elif scope == 'checksum':
+            output = hashlib.sha1(self.config).hexdigest()
+        elif scope.startswith('interfaces '):
+            names = [re.escape(n) for n in scope.split()[1:]]
+            regex = re.compile(r'^interface (%s)$' % '|'.join(names), re.M)
+            output = self.section(regex)
+        elif scope.startswith('section '):
+            output = self.section(re.compile(scope[8:], re.M))
+        else:
+            raise pyeapi.eapilib.CommandError(1002, 'not available in '
+                                              'snapshot',
+                                              command_error=command)
+        return dict(output=output)
+
+    def section(self, regex):
+        """Returns the top level config blocks matching the regex
+        """
+        blocks = list()
+        block_end = 0
+        for match in regex.finditer(self.config):
+            if match.start() < block_end:
+                continue
+            start = self.config.rfind('\n', 0, match.start()) + 1
+            while start and self.config[start] == ' ':
+                start = self.config.rfind('\n', 0, start - 1) + 1
+            end = BLOCK_END_RE.search(self.config, match.end())
+            block_end = end.start() if end else len(self.config)
+            blocks.append(self.config[start:block_end])
+        return '\n'.join(blocks)
+
+    def port_channel(self, group):
+        """Returns the port-channel members from the channel-group lines
+        """
+        regex = re.compile(r'^\s+channel-group %s mode ' % group, re.M)
+        members = [m.group(1) for m in INTERFACE_BLOCK_RE.finditer(self.config)
+                   if regex.search(m.group(2))]
+        return 'Port Channel Port-Channel%s:\n  Active Ports: %s\n' % \
+            (group, ' '.join(members))
+
+
+class DryRunConnection(object):
+    """Collects the configuration requests of a check mode run
+
+    Requests that enter configuration mode are answered with empty results
+    and never sent to the node.  Their commands are recorded in the commands
+    attribute in the order they would have been sent.  All other requests
+    are sent through the wrapped connection so the module still reads the
+    current state of the node.
+
+    Args:
+        connection (EapiConnection): The pyeapi connection to wrap
+
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.commands = list()
+
+    def __str__(self):
+        return str(self.connection)
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+    def execute(self, commands, encoding='json', **kwargs):
+        names = [c['cmd'] if isinstance(c, dict) else c for c in commands]
+        if 'configure' not in names and 'configure terminal' not in names:
+            return self.connection.execute(commands, encoding, **kwargs)
+
+        configure = False
+        for command in names:
+            if configure:
+                self.commands.append(command)
+            configure = configure or command in ['configure',
+                                                 'configure terminal']
+        return dict(jsonrpc='2.0', result=[dict() for _ in commands],
+                    id=id(self))
+
+
+class RecordingConnection(object):
+    """Records the eAPI requests sent through a pyeapi connection
+
+    Every request is appended to the fixture file as one compact JSON line
+    holding the commands, the encoding, the latency in seconds and either
+    the result or the error returned by the node.  The input of commands,
+    such as the enable password, is never recorded and the mask function
+    is applied to the whole line before it is written.
+
+    Args:
+        connection (EapiConnection): The pyeapi connection to record
+        filename (str): The path to the fixture file, any existing file
+            is replaced
+        mask (callable): Returns the line with the secret values masked
+
+    """
+
+    def __init__(self, connection, filename, mask=None):
+        self.connection = connection
+        self.filename = os.path.expanduser(filename)
+        self.mask = mask
+        self.requests = 0
+        open(self.filename, 'w').close()
+
+    def __str__(self):
+        return str(self.connection)
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+    @staticmethod
+    def mask_input(commands):
+        """Returns the commands with the input of each command masked
+        """
+        return [dict(c, input=MASKED_INPUT)
+                if isinstance(c, dict) and 'input' in c else c
+                for c in commands]
+
+    def execute(self, commands, encoding='json', **kwargs):
+        entry = dict(commands=self.mask_input(commands), encoding=encoding)
+        start = time.time()
+        try:
+            response = self.connection.execute(commands, encoding, **kwargs)
+        except pyeapi.eapilib.CommandError as exc:
+            entry['error'] = dict(code=exc.error_code, message=exc.error_text,
+                                  command_error=exc.command_error,
+                                  output=exc.output)
+            raise
+        except pyeapi.eapilib.ConnectionError as exc:
+            entry['error'] = dict(message=exc.message)
+            raise
+        else:
+            entry['result'] = response['result']
+            return response
+        finally:
+            entry['latency'] = round(time.time() - start, 6)
+            if self.mask:
+                entry = self.mask(entry)
+            self.requests += 1
+            with open(self.filename, 'a') as fh:
+                fh.write(json.dumps(entry, separators=(',', ':')) + '\n')
+
+
+class ReplayConnection(object):
+    """Answers eAPI requests from a fixture file written by a recording
+
+    Requests are matched against the recorded requests in order.  A request
+    that does not match the next recorded request is matched against the
+    remaining recorded requests; when none matches a ConnectionError is
+    raised so an extra round trip fails the module run.  The commands are
+    masked as they were when recorded and matched without their input, the
+    replay is not configured with the enable password of the recording.
+
+    Args:
+        filename (str): The path to the fixture file
+        latency (str): "none" to answer immediately, "recorded" to wait for
+            the recorded latency or a number of milliseconds to wait for
+            each request
+        mask (callable): Returns the commands with the secret values masked
+
+    """
+
+    def __init__(self, filename, latency='none', mask=None):
+        self.filename = os.path.expanduser(filename)
+        with open(self.filename) as fh:
+            self.entries = [json.loads(l) for l in fh if l.strip()]
+        self.latency = latency
+        self.mask = mask
+        self.requests = 0
+        self.error = None
+        self._unused = range(len(self.entries))
+
+    def __str__(self):
+        return 'ReplayConnection(filename=%s)' % self.filename
+
+    @staticmethod
+    def strip_input(commands):
+        return [c['cmd'] if isinstance(c, dict) else c for c in commands]
+
+    def match(self, commands, encoding):
+        commands = self.strip_input(commands)
+        for index in self._unused:
+            entry = self.entries[index]
+            if self.strip_input(entry['commands']) == commands and \
+                    entry['encoding'] == encoding:
+                self._unused.remove(index)
+                return entry
+
+    def execute(self, commands, encoding='json', **kwargs):
+        self.requests += 1
+        commands = json.loads(json.dumps(commands))
+        entry = self.match(self.mask(commands) if self.mask else commands,
+                           encoding)
+        if entry is None:
+            self.error = pyeapi.eapilib.ConnectionError(
+                'replay', 'no recorded response for %s' % commands, commands)
+            raise self.error
+
+        if self.latency == 'recorded':
+            time.sleep(entry['latency'])
+        elif self.latency != 'none':
+            time.sleep(float(self.latency) / 1000)
+
+        error = entry.get('error')
+        if error and 'code' in error:
+            self.error = pyeapi.eapilib.CommandError(
+                error['code'], error['message'], commands=commands,
+                command_error=error['command_error'], output=error['output'])
+            raise self.error
+        elif error:
+            self.error = pyeapi.eapilib.ConnectionError(
+                'replay', error['message'], commands)
+            raise self.error
+        return dict(jsonrpc='2.0', result=entry['result'], id=id(self))
+
+    def summary(self):
+        return dict(requests=self.requests, recorded=len(self.entries),
+                    unused=len(self._unused))
+
+
 class EosAnsibleModule(AnsibleModule):
 
     meta_args = {
@@ -192,14 +589,24 @@ class EosAnsibleModule(AnsibleModule):
         'transport': dict(choices=TRANSPORTS),
         'port': dict(),
         'debug': dict(type='bool', default='false'),
-        'logging': dict(type='bool', default='true')
+        'logging': dict(type='bool', default='true'),
+        'reader': dict(default='config', choices=READERS),
+        'digest_cache': dict(),
+        'config_cache': dict(),
+        'snapshot': dict(),
+        'record': dict(),
+        'replay': dict(),
+        'replay_latency': dict(default='none'),
+        'debug_max_size': dict(type='int', default=DEBUG_MAX_SIZE),
+        'debug_dest': dict()
     }
 
     stateful_args = {
         'state': dict(default='present', choices=['present', 'absent']),
     }
 
-    def __init__(self, stateful=True, autorefresh=False, *args, **kwargs):
+    def __init__(self, stateful=True, autorefresh=False, reads_config=True,
+                 *args, **kwargs):
 
         kwargs['argument_spec'].update(self.meta_args)
 
@@ -241,11 +648,25 @@ class EosAnsibleModule(AnsibleModule):
         self._attributes = self.map_argument_spec()
         self.validate()
         self._autorefresh = autorefresh
-        self._node = EosConnection(**self.params)
-        self._node.connect()
+        self._reads_config = reads_config
+
+        if self.params['snapshot']:
+            self._node = self.load_snapshot()
+        elif self.params['replay']:
+            self._node = self.connect()
+        else:
+            self._node = EosConnection(**self.params)
+            self._node.connect()
+
+            self._node = self.connect()
 
-        self._node = self.connect()
         self._instance = None
+        self._digest_cache = None
+        self._generation = None
+
+        if self.params['config_cache'] and self._reads_config and \
+                not self.params['snapshot']:
+            self.load_config_cache()
 
         self.desired_state = self.params['state'] if self._stateful else None
         self.exit_after_flush = kwargs.get('exit_after_flush')
@@ -255,9 +676,17 @@ class EosAnsibleModule(AnsibleModule):
         if self._instance:
             return self._instance
 
-        func = self.func('instance')
-        if not func:
-            self.fail('Module does not support "instance"')
+        func = None
+        if self.params['reader'] == 'json':
+            func = self.func('instance_json')
+
+        if func:
+            self.log('Using json reader for instance')
+        else:
+            func = self.func('instance')
+            if not func:
+                self.fail('Module does not support "instance"')
+            self.load_scoped_config()
 
         try:
             self._instance = func(self)
@@ -271,10 +700,262 @@ class EosAnsibleModule(AnsibleModule):
     def attributes(self):
         return self._attributes
 
+    @property
+    def schema(self):
+        """Returns the attribute schema of the module
+
+        A module can define a SCHEMA dict, ordered by the commands to send,
+        mapping an attribute to a dict with the keys below.  The commands of
+        all changed schema attributes are rendered locally and sent in a
+        single request instead of calling a set_<attribute> function.
+
+            * normalize - a function applied to the value from the playbook
+            * compare - a function of the desired and current values that
+              returns True when they are equal
+            * command - the command template, formatted with the value and
+              the module attributes, or a function of the module, desired
+              value and current value returning a list of commands
+            * negate - the command template used when the value is False,
+              an empty string or equal to the default key of the schema
+
+        """
+        return globals().get('SCHEMA') or dict()
+
     @property
     def node(self):
         return self._node
 
+    def scoped_config(self, scope):
+        """Returns the running-config limited to a single scope
+
+        The scope is appended to "show running-config all" so any value
+        accepted by EOS can be used, for instance "interfaces Ethernet1" or
+        "section vlan 100".  A trailing "end" line is added so the pyeapi
+        block parsers find the end of the last section as they would in
+        the full running-config.
+
+        Args:
+            scope (str): The running-config filter to send to the node
+
+        Returns:
+            str: The scoped running-config as a string
+
+        """
+        command = 'show running-config all %s' % scope
+        resp = self.node.run_commands(command, 'text')
+        return '%s\nend' % resp[0]['output'].strip()
+
+    def resource_scope(self):
+        """Returns the single running-config scope of the resource
+
+        Returns:
+            str: The scope returned by the module config_scope function or
+                None if the module does not define one or returns more
+                than one scope
+
+        """
+        scope = self.invoke_function('config_scope', self)
+        if scope and not isinstance(scope, basestring):
+            if len(scope) != 1:
+                self.log('Multiple config scopes, using full running-config')
+                return None
+            scope = scope[0]
+        return scope or None
+
+    def load_scoped_config(self):
+        """Loads a scoped running-config into the node for instance lookups
+
+        Modules can define a config_scope function that returns the
+        running-config scope (or list of scopes) needed to build the
+        instance.  When exactly one scope is returned, only that section
+        is fetched from the node and cached as the node running-config so
+        the pyeapi resource getters parse it instead of the full config.
+        Multiple scopes, no scope or a failed scoped fetch fall back to the
+        full running-config.
+
+        """
+        if self._node._running_config is not None:
+            return
+
+        scope = self.resource_scope()
+        if not scope:
+            return
+
+        try:
+            self._node._running_config = self.scoped_config(scope)
+        except (pyeapi.eapilib.ConnectionError, pyeapi.eapilib.CommandError):
+            self.log('Unable to load config scope %s, using full '
+                     'running-config' % scope)
+        else:
+            self.log('Loaded running-config scope %s' % scope)
+
+    def config_checksum(self):
+        """Returns the running-config checksum reported by the node
+
+        Returns:
+            str: The checksum output or None if the node does not support
+                the checksum command
+
+        """
+        try:
+            resp = self.node.run_commands(CONFIG_CHECKSUM_COMMAND, 'text')
+        except (pyeapi.eapilib.ConnectionError, pyeapi.eapilib.CommandError):
+            self.log('Unable to retrieve the running-config checksum')
+            return None
+        return resp[0]['output'].strip() or None
+
+    def config_generation(self):
+        """Returns the config generation of the node
+
+        The generation is the running-config checksum, so it changes with
+        every configuration change on the node.
+
+        Returns:
+            str: The generation or None if the node does not report one
+
+        """
+        self._generation = self.config_checksum()
+        return self._generation
+
+    def load_config_cache(self):
+        """Loads the node running-config through the config cache
+
+        The config generation of the node is probed and, if it matches the
+        cache entry of the node, the cached running-config is used for all
+        resource lookups of the module.  Otherwise the running-config is
+        read from the node and stored in the cache with the generation so
+        the next module run against the node can reuse it.
+
+        """
+        name = self.params['host'] or self.params['connection']
+        cache = ConfigCache(self.params['config_cache'], name)
+
+        generation = self.config_generation()
+        if not generation:
+            return
+
+        config = cache.get(generation)
+        hit = config is not None
+        if not hit:
+            # The output is read directly since the pyeapi running_config
+            # property fails on non-ASCII text
+            try:
+                resp = self.node.run_commands('show running-config all',
+                                              'text')
+            except (pyeapi.eapilib.ConnectionError,
+                    pyeapi.eapilib.CommandError):
+                self.log('Unable to read the running-config')
+                return
+            config = resp[0]['output'].strip()
+            cache.set(generation, config)
+        self._node._running_config = config
+
+        self.result['config_cache'] = dict(hit=hit, generation=generation)
+        self.log('Config cache %s for generation %s' %
+                 ('hit' if hit else 'miss', generation))
+
+    def section_digest(self):
+        """Returns the digest of the resource running-config section
+        """
+        scope = self.resource_scope()
+        if not scope:
+            return None
+        try:
+            config = self.scoped_config(scope)
+        except (pyeapi.eapilib.ConnectionError, pyeapi.eapilib.CommandError):
+            return None
+        if isinstance(config, unicode):
+            config = config.encode('utf-8')
+        return hashlib.sha1(config).hexdigest()
+
+    def desired_digest(self):
+        """Returns the digest of the desired state of the resource
+
+        The digest covers the module name, the connection identity and the
+        attributes, so resources managed by different modules or on
+        different nodes never share a digest even when their attributes
+        are identical.
+
+        """
+        connection = dict([(key, self.params[key]) for key in
+                           ['connection', 'host', 'port', 'transport']])
+        state = json.dumps(dict(module=self.module_name,
+                                connection=connection,
+                                attributes=self.attributes),
+                           sort_keys=True, default=str)
+        return hashlib.sha1(state).hexdigest()
+
+    def check_digest_cache(self):
+        """Checks the digest cache for a converged resource
+
+        The resource is reported as converged, without calling instance,
+        when an entry exists for the desired state digest and either the
+        node config checksum or the resource config section digest is
+        unchanged since the last successful converge.
+
+        Returns:
+            bool: True if the resource is known to be converged
+
+        """
+        if not self.params['digest_cache'] or self.params['snapshot']:
+            return False
+
+        if self._stateful and self.desired_state not in ['present', 'absent']:
+            return False
+
+        name = self.params['host'] or self.params['connection']
+        self._digest_cache = DigestCache(self.params['digest_cache'], name)
+
+        self._desired_digest = self.desired_digest()
+        self._checksum = self._generation or self.config_checksum()
+        self._section_digest = None
+
+        hit = False
+        entry = self._digest_cache.get(self._desired_digest)
+        if entry:
+            if self._checksum and entry['checksum'] == self._checksum:
+                hit = True
+            else:
+                self._section_digest = self.section_digest()
+                hit = bool(self._section_digest and
+                           entry['section'] == self._section_digest)
+
+        self._digest_cache.record(hit)
+        self.result['digest_cache'] = self._digest_cache.summary(hit)
+        self.log('Digest cache %s for %s' % ('hit' if hit else 'miss',
+                                             self._desired_digest))
+
+        if hit:
+            entry['checksum'] = self._checksum
+            self._digest_cache.save()
+        return hit
+
+    def update_digest_cache(self):
+        """Stores the digests of the converged resource in the cache
+        """
+        if not self._digest_cache or self.check_mode:
+            return
+
+        checksum = self._checksum
+        section = self._section_digest
+        if self.result['changed']:
+            checksum = self.config_checksum()
+            section = None
+
+        if section is None:
+            section = self.section_digest()
+
+        self._digest_cache.set(self._desired_digest, checksum=checksum,
+                               section=section)
+        self._digest_cache.save()
+
+    @property
+    def module_name(self):
+        """Returns the name of the module from its DOCUMENTATION
+        """
+        match = MODULE_NAME_RE.search(globals().get('DOCUMENTATION', ''))
+        return match.group(1) if match else None
+
     def check_pyeapi(self):
         if not PYEAPI_AVAILABLE:
             self.fail('Unable to import pyeapi, is it installed?')
@@ -302,34 +983,62 @@ class EosAnsibleModule(AnsibleModule):
     def validate(self):
         for key, value in self.attributes.iteritems():
             func = self.func('validate_%s' % key)
+            if not func:
+                func = self.schema.get(key, dict()).get('normalize')
             if func:
                 self.attributes[key] = func(value)
 
     def create(self):
-        if not self.check_mode:
-            func = self.func('create')
-            if not func:
-                self.fail('Module must define "create" function')
-            return self.invoke(func, self)
+        func = self.func('create')
+        if not func:
+            self.fail('Module must define "create" function')
+        return self.invoke(func, self)
+
+    def created_instance(self):
+        """Returns the predicted instance of the resource after create
+
+        A module can define a created function returning the attributes
+        set by its create commands, including the defaults the node assigns
+        to a new resource, so check mode and snapshot runs send the same
+        commands as a real run.  The other attributes keep the values of the
+        absent instance.
+        """
+        instance = dict(self.instance, state='present')
+        func = self.func('created')
+        if func:
+            instance.update(self.invoke(func, self))
+        return instance
 
     def remove(self):
-        if not self.check_mode:
-            func = self.func('remove')
-            if not func:
-                self.fail('Module most define "remove" function')
-            return self.invoke(func, self)
+        func = self.func('remove')
+        if not func:
+            self.fail('Module most define "remove" function')
+        return self.invoke(func, self)
 
     def flush(self, exit_after_flush=False):
         self.exit_after_flush = exit_after_flush
 
+        if self.check_digest_cache():
+            if self.exit_after_flush:
+                self.exit()
+            return
+
+        before = dict(self.instance)
+
         if self.desired_state == 'present' or not self._stateful:
             if self.instance.get('state') == 'absent':
                 changed = self.create()
                 self.result['changed'] = changed or True
-                self.refresh()
-                # After a create command, flush the running-config
-                # so we get the latest for any other attributes
-                self._node._running_config = None
+                if self.check_mode or self.params['snapshot']:
+                    # Nothing was created in check mode or on a snapshot
+                    # so the attributes are compared against the instance
+                    # predicted after create
+                    self._instance = self.created_instance()
+                else:
+                    self.refresh()
+                    # After a create command, flush the running-config
+                    # so we get the latest for any other attributes
+                    self._node._running_config = None
 
             changeset = self.attributes.viewitems() - self.instance.viewitems()
 
@@ -343,28 +1052,44 @@ class EosAnsibleModule(AnsibleModule):
                 self.result['changed'] = True
 
             self._attributes.update(changes)
+            predicted = dict(self.instance, **changes)
 
             flush = self.func('flush')
             if flush:
                 self.invoke(flush, self)
 
         elif self.desired_state == 'absent' and self._stateful:
+            predicted = dict(self.instance, state='absent')
             if self.instance.get('state') == 'present':
                 changed = self.remove()
                 self.result['changed'] = changed or True
 
         elif self._stateful:
+            predicted = dict(self.instance, state=self.desired_state)
             if self.desired_state != self.instance.get('state'):
                 func = self.func(self.desired_state)
                 changed = self.invoke(func, self)
                 self.result['changed'] = changed or True
 
-        self.refresh()
-        # By calling self.instance here we trigger another show running-config
-        # all which causes delay.  Only if debug is enabled do we call this
-        # since it will display the latest state of the object.
-        if self._debug:
-            self.result['instance'] = self.instance
+        if getattr(self, '_diff', False) and self.result['changed']:
+            # The after state is predicted from the instance read before
+            # the changes so diff mode does not read the resource again
+            self.result['diff'] = dict(before=before, after=predicted)
+
+        if self.check_mode:
+            # The predicted instance is the current instance with the
+            # changes applied, the node config was never changed
+            self.result['instance'] = predicted
+        else:
+            self.refresh()
+            # By calling self.instance here we trigger another show
+            # running-config all which causes delay.  Only if debug is
+            # enabled do we call this since it will display the latest
+            # state of the object.
+            if self._debug:
+                self.result['instance'] = self.bound('instance', self.instance)
+
+        self.update_digest_cache()
 
         if self.exit_after_flush:
             self.exit()
@@ -373,16 +1098,82 @@ class EosAnsibleModule(AnsibleModule):
         changes = dict()
         for key, value in changeset:
             if value is not None:
+                compare = self.schema.get(key, dict()).get('compare')
+                if compare and compare(value, self.instance.get(key)):
+                    continue
                 changes[key] = value
+                if key in self.schema:
+                    continue
                 func = self.func('set_%s' % key)
-                if func and not self.check_mode:
+                if func:
                     try:
                         self.invoke(func, self)
                     except Exception as exc:
                         self.fail(exc.message)
+
+        commands = self.render(changes)
+        if commands:
+            self.log('Sending commands %s' % commands)
+            try:
+                self.node.config(commands)
+            except Exception as exc:
+                self.fail(exc.message)
         return changes
 
-    def connect(self):
+    def render(self, changes):
+        """Renders the commands for the changed schema attributes
+
+        The commands are prefixed with the configuration mode returned by
+        the config_block function of the module, if it defines one.
+
+        Args:
+            changes (dict): The changed attributes and their desired values
+
+        Returns:
+            list: The commands to send to the node, or an empty list if no
+                schema attribute changed
+
+        """
+        commands = list()
+        for key, spec in self.schema.items():
+            if key not in changes:
+                continue
+            value = changes[key]
+            template = spec.get('command')
+            if callable(template):
+                commands.extend(template(self, value, self.instance.get(key)))
+                continue
+            if value is False or value == '' or \
+                    ('default' in spec and value == spec['default']):
+                template = spec.get('negate', template)
+            commands.append(template.format(value=value, **self.attributes))
+
+        if commands:
+            block = self.func('config_block')
+            if block:
+                commands.insert(0, self.invoke(block, self))
+        return commands
+
+    def replay_connection(self):
+        """Returns the connection replaying the recorded eAPI requests
+        """
+        latency = self.params['replay_latency']
+        if latency not in REPLAY_LATENCY:
+            try:
+                float(latency)
+            except ValueError:
+                self.fail('replay_latency must be one of %s or a number of '
+                          'milliseconds' % ', '.join(REPLAY_LATENCY))
+        try:
+            return ReplayConnection(self.params['replay'], latency,
+                                    mask=self.mask)
+        except (IOError, ValueError) as exc:
+            self.fail('unable to load replay fixture %s: %s' %
+                      (self.params['replay'], exc))
+
+    def make_connection(self):
+        """Returns the pyeapi connection and the connection settings
+        """
         if self.params['config']:
             pyeapi.load_config(self.params['config'])
 
@@ -413,6 +1204,25 @@ class EosAnsibleModule(AnsibleModule):
             self.fail('Connection must define a transport')
 
         connection = pyeapi.client.make_connection(**config)
+        if self.params['record']:
+            connection = RecordingConnection(connection, self.params['record'],
+                                             mask=self.mask)
+            self.log('Recording eAPI requests to %s' % connection.filename)
+
+        return (connection, config)
+
+    def connect(self):
+        if self.params['replay']:
+            connection = self.replay_connection()
+            config = dict()
+            self.log('Replaying eAPI requests from %s' % connection.filename)
+        else:
+            (connection, config) = self.make_connection()
+
+        if self.check_mode:
+            connection = DryRunConnection(connection)
+            self.log('Check mode, configuration requests are not sent')
+
         self.log('Creating connection with autorefresh=%s' % self._autorefresh)
         node = pyeapi.client.Node(connection, autorefresh=self._autorefresh,
                                   **config)
@@ -429,10 +1239,40 @@ class EosAnsibleModule(AnsibleModule):
 
         return node
 
+    def load_snapshot(self):
+        """Returns a node that answers from a running-config snapshot
+
+        No connection is made to the node.  The configuration commands sent
+        by the module are collected by the snapshot connection and returned
+        as the commands key of the module result.
+
+        """
+        filename = self.params['snapshot']
+        try:
+            connection = SnapshotConnection(filename)
+        except (IOError, ValueError) as exc:
+            self.fail('unable to load snapshot %s: %s' % (filename, exc))
+
+        self.log('Loaded running-config snapshot %s' % filename)
+        self.debug('node', str(connection))
+        return pyeapi.client.Node(connection, autorefresh=self._autorefresh)
+
+    def enable(self, commands, encoding='json'):
+        """Sends the list of enable commands to the node in one request
+
+        Args:
+            commands (list): The show commands to send to the node
+            encoding (str): The requested encoding of the command output
+
+        Returns:
+            list: The result of each command in the order it was sent
+
+        """
+        return self.node.run_commands(commands, encoding)
+
     def config(self, commands):
         self.result['changed'] = True
-        if not self.check_mode:
-            self.node.config(commands)
+        self.node.config(commands)
 
     def api(self, module):
         return self.node.api(module)
@@ -458,17 +1298,175 @@ class EosAnsibleModule(AnsibleModule):
 
     def exit(self):
         self.invoke_function('on_exit', self)
+        if self.params['snapshot']:
+            self.result['commands'] = self.node.connection.commands
+        elif self.params['replay']:
+            self.result['replay'] = self.node.connection.summary()
+        elif self.params['record']:
+            requests = self.node.connection.requests
+            self.result['record'] = dict(requests=requests)
+        if self.check_mode and not self.params['snapshot']:
+            self.result['commands'] = self.node.connection.commands
         self.log('Module completed successfully')
         self.exit_json(**self.result)
 
     def refresh(self):
-        self._instance = None
+        # A snapshot is never changed by the module so the instance read
+        # before any configuration stays valid for the rest of the run
+        if not self.params['snapshot']:
+            self._instance = None
 
     def debug(self, key, value):
         if self._debug:
             if 'debug' not in self.result:
                 self.result['debug'] = dict()
-            self.result['debug'][key] = value
+            self.result['debug'][key] = self.bound(key, value)
+
+    def bound(self, key, value):
+        """Caps the size of a debug value returned in the module result
+
+        Values that serialize to more than debug_max_size bytes are replaced
+        by their size, their sha1 digest and a copy truncated to
+        debug_max_size bytes.  A debug_max_size of 0 keeps only the size and
+        digest and a negative value disables the cap.  When debug_dest is
+        set the full value is written to a file in that directory named
+        after the key and digest, and the path is returned as well.  The
+        values of no_log arguments are masked first and the value is
+        measured, hashed and written as UTF-8.
+        """
+        value = self.mask(value)
+        if isinstance(value, basestring):
+            text = value
+        else:
+            text = json.dumps(value, sort_keys=True, default=str)
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+
+        limit = self.params['debug_max_size']
+        if limit < 0 or len(text) <= limit:
+            return value
+
+        digest = hashlib.sha1(text).hexdigest()
+        bounded = dict(size=len(text), sha1=digest)
+        if limit:
+            # A multibyte character cut by the limit is dropped
+            bounded['truncated'] = text[:limit].decode('utf-8', 'ignore') + \
+                DEBUG_TRUNCATED % (len(text) - limit)
+
+        dest = self.params['debug_dest']
+        if dest:
+            path = os.path.join(dest, '%s-%s' % (key, digest))
+            if not os.path.exists(path):
+                with self.private_file(path) as fh:
+                    fh.write(text)
+            bounded['path'] = path
+        return bounded
+
+    def private_file(self, path):
+        """Opens a new file only readable by its owner for writing
+
+        The debug and result files can hold the running-config and secret
+        hashes, so a missing parent directory is created only accessible
+        by its owner as well.
+        """
+        dirname = os.path.dirname(path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname, 0700)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+        return os.fdopen(fd, 'wb')
+
+    def mask(self, value):
+        """Returns the value with the values of no_log arguments masked
+
+        Values of types unknown to remove_values are masked as JSON text.
+        """
+        no_log_values = getattr(self, 'no_log_values', None)
+        if not no_log_values:
+            return value
+        try:
+            return remove_values(value, no_log_values)
+        except TypeError:
+            text = json.dumps(value, sort_keys=True, default=str)
+            return remove_values(text, no_log_values)
+
+    def spill(self, value, dest, compress=False):
+        """Writes a result value to a content addressed file
+
+        The value is serialized as JSON and written to a file in the dest
+        directory named after the sha1 digest of the JSON, with a .gz suffix
+        when compressed.  A file that already exists is not written again
+        and new files are only readable by their owner.
+
+        Returns:
+            dict: The path, the size of the file in bytes and the sha1
+                digest of the uncompressed JSON
+
+        """
+        text = json.dumps(self.mask(value), sort_keys=True)
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        digest = hashlib.sha1(text).hexdigest()
+        path = os.path.join(dest, '%s.json%s' % (digest,
+                                                 '.gz' if compress else ''))
+        if not os.path.exists(path):
+            tmpfile = '%s.%s' % (path, os.getpid())
+            with self.private_file(tmpfile) as fh:
+                if compress:
+                    gz = gzip.GzipFile(fileobj=fh, mode='wb', mtime=0)
+                    gz.write(text)
+                    gz.close()
+                else:
+                    fh.write(text)
+            os.rename(tmpfile, path)
+        return dict(path=path, size=os.path.getsize(path), sha1=digest,
+                    compressed=compress)
+
+    def select(self, value, pointer):
+        """Returns the part of a value addressed by a JSON pointer
+
+        Supports the RFC 6901 syntax, for instance /0/result/version or
+        /interfaces/Ethernet1~11/mtu where ~1 stands for / and ~0 for ~.
+
+        Returns:
+            object: The addressed value or None if it does not exist
+
+        """
+        if pointer in ['', '/']:
+            return value
+        for token in pointer.lstrip('/').split('/'):
+            token = token.replace('~1', '/').replace('~0', '~')
+            try:
+                if isinstance(value, list):
+                    value = value[int(token)]
+                else:
+                    value = value[token]
+            except (KeyError, IndexError, ValueError, TypeError):
+                return None
+        return value
+
+    def reduce_result(self, value):
+        """Applies the result_dest and result_select options to a value
+
+        With result_dest the full value is written to a file (see spill)
+        and the path, size and digest are stored in result_file.  With
+        result_select only the parts of the value addressed by the comma
+        delimited JSON pointers are kept, keyed by pointer.
+
+        Returns:
+            object: The value to return in the module result or None if
+                the value was only written to a file
+
+        """
+        dest = self.params.get('result_dest')
+        if dest:
+            compress = self.boolean(self.params.get('result_compress'))
+            self.result['result_file'] = self.spill(value, dest, compress)
+
+        pointers = self.params.get('result_select')
+        if pointers:
+            pointers = [p.strip() for p in pointers.split(',')]
+            return dict([(p, self.select(value, p)) for p in pointers])
+        return None if dest else value
 
     def log(self, message, log_args=None, priority=None):
         if self._logging:
@@ -503,6 +1501,11 @@ def create(module):
     module.log('Invoked create for eos_bgp_config[{}]'.format(bgp_as))
     module.node.api('bgp').create(bgp_as)
 
+def created(module):
+    """Returns the attributes of the BGP routing instance set by create
+    """
+    return dict(enable=True)
+
 def remove(module):
     """Removes the BGP routing instance from the node
     """
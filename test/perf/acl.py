@@ -0,0 +1,70 @@
+"""Benchmarks the eos_acl_entry optimizer on large standard ACLs
+
+The optimizer of the library module is run without a node on synthetic
+access lists.  The random case draws entries from a few /16 networks so
+shadowed, duplicate and mergeable entries all occur.  The siblings case is
+a run of consecutive host entries that merges into a single prefix.
+
+    $ cd test && python -m perf.acl --entries 50000
+"""
+import time
+import random
+import argparse
+
+from perf.modules import load_module
+
+LENGTHS = [16, 22, 23, 24, 24, 25, 26, 28, 32, 32]
+
+
+def random_entries(module, count, seed):
+    generator = random.Random(seed)
+    entries = dict()
+    for index in range(count):
+        prefixlen = generator.choice(LENGTHS)
+        addr = (10 << 24 | generator.randint(0, 255) << 16 |
+                generator.randint(0, 255) << 8 | generator.randint(0, 255))
+        seqno = (index + 1) * 10
+        entries[seqno] = dict(
+            seqno=seqno, action=generator.choice(['permit', 'deny']),
+            srcaddr=module['int_to_ip'](addr & module['MASKS'][prefixlen]),
+            srcprefixlen=prefixlen, log=False)
+    return entries
+
+
+def sibling_entries(module, count, seed):
+    entries = dict()
+    for index in range(count):
+        seqno = (index + 1) * 10
+        entries[seqno] = dict(
+            seqno=seqno, action='permit', srcprefixlen=32, log=False,
+            srcaddr=module['int_to_ip']((10 << 24) + index))
+    return entries
+
+
+CASES = [('random', random_entries), ('siblings', sibling_entries)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--entries', type=int, action='append',
+                        help='number of entries (default 1k, 10k and 50k)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    module = load_module('eos_acl_entry')
+    row = '%-10s %8s %9s %6s %8s %7s %9s'
+    print row % ('case', 'entries', 'optimized', 'dups', 'shadowed',
+                 'merged', 'time(ms)')
+    for count in args.entries or [1000, 10000, 50000]:
+        for name, build in CASES:
+            entries = build(module, count, args.seed)
+            start = time.time()
+            (_, report) = module['optimize_entries'](entries)
+            elapsed = time.time() - start
+            print row % (name, report['entries'], report['optimized'],
+                         len(report['duplicates']), len(report['shadowed']),
+                         len(report['merged']), '%.1f' % (elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Benchmarks the library modules against a local eAPI stand-in
+
+Every module is run in-process against the fake eAPI server serving
+running-configs of increasing size.  For each run the wall time, the number
+of eAPI requests and the bytes exchanged with the server are reported.
+
+    $ cd test && python -m perf.bench
+    $ cd test && python -m perf.bench --transport socket --lines 100000
+    $ cd test && python -m perf.bench --transport emulator
+    $ cd test && python -m perf.bench --profile large --seed 7
+"""
+import os
+import time
+import argparse
+import tempfile
+
+from perf import generator
+from perf.modules import run_module
+from perf.emulator import Emulator
+from perf.eapi_server import Backend, FakeEapi
+
+LINES = [1000, 10000, 100000]
+
+CASES = [
+    ('eos_acl_entry', dict(acltype='standard', name='test', seqno='10',
+                           action='permit', srcaddr='1.2.3.4',
+                           srcprefixlen='32')),
+    ('eos_bgp_config', dict(bgp_as='65000')),
+    ('eos_bgp_neighbor', dict(name='192.168.255.1')),
+    ('eos_bgp_network', dict(prefix='172.16.10.0', masklen='24')),
+    ('eos_command', dict(commands='show version')),
+    ('eos_config', dict(command='hostname veos')),
+    ('eos_ethernet', dict(name='Ethernet1')),
+    ('eos_facts', dict()),
+    ('eos_interface', dict(name='Ethernet1')),
+    ('eos_ipinterface', dict(name='Ethernet3')),
+    ('eos_mlag_config', dict()),
+    ('eos_mlag_interface', dict(name='Port-Channel1')),
+    ('eos_ping', dict(dst='127.0.0.1', count='1')),
+    ('eos_portchannel', dict(name='Port-Channel1')),
+    ('eos_purge', dict(resource='eos_vlan', results='{"results": []}')),
+    ('eos_routemap', dict(name='test', action='permit', seqno='10')),
+    ('eos_staticroute', dict(ip_dest='0.0.0.0/0', next_hop='192.168.1.254')),
+    ('eos_stp_interface', dict(name='Ethernet1')),
+    ('eos_switchport', dict(name='Ethernet1')),
+    ('eos_system', dict()),
+    ('eos_user', dict(name='admin')),
+    ('eos_varp', dict(mac_address='00:1c:73:00:00:99')),
+    ('eos_varp_interface', dict(name='Vlan100', shared_ip='10.100.0.1')),
+    ('eos_vlan', dict(vlanid='100')),
+    ('eos_vrrp', dict(interface='Vlan100', vrid='1', primary_ip='10.100.0.3',
+                      preempt_delay_min='1', preempt_delay_reload='1',
+                      delay_reload='1')),
+    ('eos_vxlan', dict(name='Vxlan1')),
+    ('eos_vxlan_vlan', dict(name='Vxlan1', vlan='100')),
+    ('eos_vxlan_vtep', dict(name='Vxlan1', vtep='1.1.1.1')),
+]
+
+
+def measure(server, module, arguments, check_mode):
+    server.stats.reset()
+    start = time.time()
+    (exitcode, result) = run_module(module, arguments, check_mode)
+    elapsed = time.time() - start
+    stats = server.stats.todict()
+    return dict(wall=elapsed, failed=bool(exitcode) or result.get('failed'),
+                msg=result.get('msg'), **stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--transport', default='http',
+                        choices=['http', 'socket', 'emulator'])
+    parser.add_argument('--lines', type=int, action='append',
+                        help='running-config size in lines (repeatable)')
+    parser.add_argument('--profile', action='append',
+                        choices=sorted(generator.PROFILES),
+                        help='synthetic config profile (repeatable)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the synthetic configs')
+    parser.add_argument('--module', action='append',
+                        help='only run the case for this module')
+    parser.add_argument('--check', action='store_true',
+                        help='run the modules in check mode')
+    args = parser.parse_args()
+
+    config = tempfile.NamedTemporaryFile(suffix='.conf', delete=False)
+    config.close()
+
+    configs = list()
+    for name in args.profile or list():
+        synthetic = generator.Synthetic.profile(name, args.seed)
+        configs.append((name, synthetic.running_config(),
+                        synthetic.responses()))
+    if not configs or args.lines:
+        for lines in args.lines or LINES:
+            configs.append((lines, generator.running_config(lines), dict()))
+
+    row = '%-20s %8s %9s %5s %10s %10s'
+    print row % ('module', 'config', 'wall(ms)', 'reqs', 'sent', 'received')
+
+    if args.transport == 'emulator':
+        server = Emulator()
+    else:
+        server = FakeEapi(Backend(), args.transport)
+
+    with server:
+        server.write_config(config.name)
+        try:
+            for (size, running_config, responses) in configs:
+                server.backend.running_config = running_config
+                server.backend.responses.update(responses)
+                for module, arguments in CASES:
+                    if args.module and module not in args.module:
+                        continue
+                    params = dict(arguments, connection='fake',
+                                  config=config.name, logging='false')
+                    stats = measure(server, module, params, args.check)
+                    print row % (module, size,
+                                 '%.1f' % (stats['wall'] * 1000),
+                                 stats['requests'], stats['bytes_received'],
+                                 stats['bytes_sent']),
+                    print 'FAILED: %s' % stats['msg'] if stats['failed'] \
+                        else ''
+        finally:
+            os.unlink(config.name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""Compares the commands of check mode and snapshot runs with real runs
+
+Every case creates a resource that is not in the canned running-config.  It
+is run for real, in check mode and on a snapshot of the running-config, each
+time against a fresh emulator.  The commands returned by the check mode and
+snapshot runs must be the commands the emulator received in the real run, in
+the same order, and all runs must report the same changes.
+
+    $ cd test && python -m perf.checkmode
+    $ cd test && python -m perf.checkmode --module eos_vlan
+"""
+import os
+import sys
+import argparse
+import tempfile
+
+from perf import generator
+from perf.modules import run_module
+from perf.emulator import Emulator, EmulatorBackend
+
+# module, arguments and the commands removing the resource from the canned
+# running-config before the runs
+CASES = [
+    ('eos_acl_entry', dict(acltype='standard', name='new', seqno='10',
+                           action='permit', srcaddr='1.2.3.4',
+                           srcprefixlen='32'), []),
+    ('eos_bgp_config', dict(bgp_as='65000'), ['no router bgp 65000']),
+    ('eos_bgp_neighbor', dict(name='192.168.255.9'), []),
+    ('eos_bgp_neighbor', dict(name='192.168.255.9', remote_as='65009',
+                              description='new', enable='true'), []),
+    ('eos_bgp_network', dict(prefix='172.16.99.0', masklen='24'), []),
+    ('eos_interface', dict(name='Loopback9', description='new'), []),
+    ('eos_ipinterface', dict(name='Ethernet2', address='10.9.0.1/24',
+                             mtu='9000'), []),
+    ('eos_ipinterface', dict(name='Ethernet2', mtu='9214'), []),
+    ('eos_mlag_interface', dict(name='Port-Channel9', mlag_id='9'), []),
+    ('eos_portchannel', dict(name='Port-Channel9', members='Ethernet2'), []),
+    ('eos_portchannel', dict(name='Port-Channel9', minimum_links='0'), []),
+    ('eos_routemap', dict(name='new', action='permit', seqno='10',
+                          description='new'), []),
+    ('eos_staticroute', dict(ip_dest='10.9.0.0/16',
+                             next_hop='192.168.1.1'), []),
+    ('eos_staticroute', dict(ip_dest='10.9.0.0/16', next_hop='Ethernet2',
+                             next_hop_ip='10.0.2.254', distance='20',
+                             tag='9', route_name='new'), []),
+    ('eos_switchport', dict(name='Ethernet3', mode='trunk'), []),
+    ('eos_switchport', dict(name='Ethernet3', mode='access',
+                            access_vlan='1'), []),
+    ('eos_user', dict(name='new', secret='$1$J0auuPhz$Pkr5NnHssW.Jqlk17Ylpk0',
+                      encryption='md5', role='network-admin'), []),
+    ('eos_vlan', dict(vlanid='300'), []),
+    ('eos_vlan', dict(vlanid='300', name='new', trunk_groups='b,a'), []),
+    ('eos_vlan', dict(vlanid='300', name='VLAN0300'), []),
+    ('eos_vrrp', dict(interface='Vlan100', vrid='9', primary_ip='10.100.0.9',
+                      preempt_delay_min='1', preempt_delay_reload='1',
+                      delay_reload='1'), []),
+    ('eos_vrrp', dict(interface='Vlan100', vrid='9', preempt_delay_min='1',
+                      preempt_delay_reload='1', delay_reload='1'), []),
+    ('eos_vxlan', dict(name='Vxlan1', source_interface='Loopback0'),
+     ['no interface Vxlan1']),
+    ('eos_vxlan', dict(name='Vxlan1', udp_port='4789'),
+     ['no interface Vxlan1']),
+    ('eos_vxlan_vlan', dict(name='Vxlan1', vlan='300', vni='10300'), []),
+    ('eos_vxlan_vtep', dict(name='Vxlan1', vtep='2.2.2.2'), []),
+]
+
+
+MODES = ['real', 'check', 'snapshot']
+
+
+class RecordingBackend(EmulatorBackend):
+    """Emulator backend that records the configuration commands it applies
+    """
+
+    def __init__(self, running_config='', responses=None):
+        self.commands = list()
+        super(RecordingBackend, self).__init__(running_config, responses)
+
+    def configure(self, command):
+        if command != 'enable':
+            self.commands.append(command)
+        return super(RecordingBackend, self).configure(command)
+
+
+def backend(setup):
+    """Returns a recording backend loaded with the canned running-config
+    """
+    emulator = RecordingBackend(generator.canned_config())
+    emulator.execute(['configure'] + setup)
+    emulator.commands = list()
+    return emulator
+
+
+def run(module, arguments, setup, mode):
+    """Runs the case and returns the commands sent or reported
+
+    Returns:
+        tuple: The exit code, the module result and the commands
+
+    """
+    emulator = backend(setup)
+    with Emulator(emulator) as em:
+        filename = em.write_config(tempfile.mktemp(suffix='.conf'))
+        params = dict(arguments, connection='fake', config=filename,
+                      logging='false')
+        if mode == 'snapshot':
+            params['snapshot'] = tempfile.mktemp(suffix='.snapshot')
+            with open(params['snapshot'], 'w') as fh:
+                fh.write(emulator.running_config)
+        try:
+            (exitcode, result) = run_module(module, params,
+                                            check_mode=mode == 'check')
+        finally:
+            os.remove(filename)
+            if mode == 'snapshot':
+                os.remove(params['snapshot'])
+    if mode == 'real':
+        return (exitcode, result, emulator.commands)
+    return (exitcode, result, result.get('commands'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--module', action='append',
+                        help='only run the cases for this module')
+    args = parser.parse_args()
+
+    failed = 0
+    for module, arguments, setup in CASES:
+        if args.module and module not in args.module:
+            continue
+        runs = dict([(mode, run(module, arguments, setup, mode))
+                     for mode in MODES])
+        (_, expected, real) = runs['real']
+        errors = list()
+        for mode in MODES:
+            (exitcode, result, commands) = runs[mode]
+            if exitcode:
+                errors.append('%s run failed: %s' % (mode, result.get('msg')))
+            elif mode == 'real':
+                continue
+            elif commands != real:
+                errors.append('%s commands %s' % (mode, commands))
+            elif result.get('changes') != expected.get('changes'):
+                errors.append('%s changes %s, real changes %s' %
+                              (mode, result.get('changes'),
+                               expected.get('changes')))
+        if errors:
+            failed += 1
+            errors.insert(0, 'real commands %s' % real)
+        print '%-20s %s' % (module, 'FAILED' if errors else 'ok')
+        for error in errors:
+            print '    %s' % error
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,395 @@
+"""Local eAPI stand-in for running the library modules without a switch
+
+The server answers eAPI JSON-RPC requests over HTTP or a Unix socket from a
+backend holding a running-config string and a set of canned show command
+responses.  Configuration commands are accepted but only applied with the
+emulator backend (perf.emulator, --emulate on the command line).  Request
+and byte counters are kept so benchmarks can report the eAPI cost of a
+module run.
+
+    $ cd test && python -m perf.eapi_server --port 8080 --lines 10000
+    $ cd test && python -m perf.eapi_server --profile large --seed 7
+"""
+import os
+import re
+import json
+import hashlib
+import argparse
+import threading
+import SocketServer
+import BaseHTTPServer
+
+from perf import generator
+
+VERSION = {
+    'modelName': 'vEOS',
+    'internalVersion': '4.15.2F-2663444.4152F',
+    'systemMacAddress': '00:1c:73:00:00:01',
+    'serialNumber': '',
+    'memTotal': 1897596,
+    'bootupTimestamp': 1445432112.66,
+    'memFree': 100864,
+    'version': '4.15.2F',
+    'architecture': 'i386',
+    'internalBuildId': '0ebbad93-563f-4920-8ecb-731057802b58',
+    'hardwareRevision': ''
+}
+
+RESPONSES = {
+    'show version': VERSION,
+    'show hostname': {'hostname': 'veos', 'fqdn': 'veos.localdomain'},
+    'show vlan': {
+        'vlans': {
+            '1': {'status': 'active', 'name': 'default', 'dynamic': False,
+                  'interfaces': {'Ethernet1': {'privatePromoted': False}}},
+            '100': {'status': 'active', 'name': 'VLAN0100', 'dynamic': False,
+                    'interfaces': {}},
+            '200': {'status': 'suspended', 'name': 'VLAN0200',
+                    'dynamic': False, 'interfaces': {}}
+        },
+        'sourceDetail': ''
+    },
+    'show interfaces': {
+        'interfaces': {
+            'Ethernet1': {'name': 'Ethernet1', 'description':
+                          'test_description', 'interfaceStatus': 'connected',
+                          'lineProtocolStatus': 'up', 'mtu': 9214,
+                          'bandwidth': 10000000000},
+            'Management1': {'name': 'Management1', 'description': '',
+                            'interfaceStatus': 'connected',
+                            'lineProtocolStatus': 'up', 'mtu': 1500,
+                            'bandwidth': 1000000000}
+        }
+    },
+    'show lldp neighbors': {
+        'lldpNeighbors': [
+            {'port': 'Ethernet1', 'neighborDevice': 'veos02',
+             'neighborPort': 'Ethernet1', 'ttl': 120}
+        ],
+        'tablesLastChangeTime': 1445432200.12,
+        'tablesAgeouts': 0,
+        'tablesInserts': 1,
+        'tablesDrops': 0,
+        'tablesDeletes': 0
+    },
+    'show port-channel 1 all-ports': (
+        'Port Channel Port-Channel1:\n'
+        '  Active Ports: Ethernet2\n'),
+}
+
+PING = """PING %(dst)s (%(dst)s) 72(100) bytes of data.
+80 bytes from %(dst)s: icmp_req=1 ttl=64 time=0.110 ms
+
+--- %(dst)s ping statistics ---
+%(count)s packets transmitted, %(count)s received, 0%% packet loss, time 4ms
+"""
+
+RUNNING_CONFIG_RE = re.compile(r'^show running-config(?: all)?(?: (.+))?$')
+PING_RE = re.compile(r'^ping (\S+)(?: repeat (\d+))?')
+
+
+class CommandError(Exception):
+
+    def __init__(self, code, message, output=None, errors=None):
+        super(CommandError, self).__init__(message)
+        self.code = code
+        self.message = message
+        self.output = output or list()
+        self.errors = errors or [message]
+
+
+def sections(config):
+    """Splits a config into its top level sections
+    """
+    blocks = list()
+    for line in config.split('\n'):
+        if not line.startswith(' ') and line != '!' or not blocks:
+            blocks.append([line])
+        else:
+            blocks[-1].append(line)
+    return ['\n'.join(block) for block in blocks]
+
+
+class Backend(object):
+    """Answers eAPI commands from a running-config and canned responses
+
+    Args:
+        running_config (str): The running-config returned by show
+            running-config commands
+        responses (dict): Canned responses keyed by show command.  JSON
+            responses are dicts and text responses are strings
+
+    """
+
+    def __init__(self, running_config='', responses=None):
+        self.running_config = running_config
+        self.responses = dict(RESPONSES)
+        self.responses.update(responses or dict())
+
+    def execute(self, commands, encoding='json'):
+        """Runs the list of commands of a single eAPI request
+
+        Returns:
+            list: The result of each command
+
+        Raises:
+            CommandError: If any command fails, with the output of the
+                commands that completed
+
+        """
+        results = list()
+        configure = False
+        for index, command in enumerate(commands):
+            if isinstance(command, dict):
+                command = command['cmd']
+            command = command.strip()
+            try:
+                if command in ['configure', 'configure terminal']:
+                    configure = True
+                    results.append(dict())
+                elif command == 'enable' or configure:
+                    results.append(self.configure(command))
+                else:
+                    results.append(self.show(command, encoding))
+            except CommandError as exc:
+                message = "CLI command %s of %s '%s' failed: %s" % \
+                    (index + 1, len(commands), command, exc.message)
+                raise CommandError(exc.code, message, results, exc.errors)
+        return results
+
+    def configure(self, command):
+        return dict()
+
+    def show(self, command, encoding):
+        match = RUNNING_CONFIG_RE.match(command)
+        if match:
+            if encoding == 'json':
+                raise CommandError(1003, 'not supported in JSON format')
+            return dict(output=self.show_running_config(match.group(1)))
+
+        match = PING_RE.match(command)
+        if match:
+            output = PING % dict(dst=match.group(1),
+                                 count=match.group(2) or 5)
+            return dict(output=output)
+
+        if command not in self.responses:
+            raise CommandError(1002, 'invalid command')
+
+        response = self.responses[command]
+        if isinstance(response, basestring):
+            if encoding == 'json':
+                raise CommandError(1003, 'not supported in JSON format')
+            return dict(output=response)
+
+        if encoding == 'text':
+            return dict(output=json.dumps(response, indent=2))
+        return response
+
+    def show_running_config(self, scope=None):
+        config = self.running_config
+        if not scope:
+            return config
+        if scope == 'checksum':
+            if isinstance(config, unicode):
+                config = config.encode('utf-8')
+            return hashlib.sha1(config).hexdigest()
+        if scope.startswith('interfaces '):
+            names = scope.split()[1:]
+            regex = re.compile(r'^interface (%s)$' %
+                               '|'.join([re.escape(n) for n in names]), re.M)
+        elif scope.startswith('section '):
+            regex = re.compile(scope[len('section '):], re.M)
+        else:
+            raise CommandError(1002, 'invalid command')
+        blocks = [b for b in sections(config) if regex.search(b)]
+        return '\n'.join(blocks)
+
+
+class Stats(object):
+    """Counts the eAPI requests served and the bytes exchanged
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.commands = 0
+        self.bytes_received = 0
+        self.bytes_sent = 0
+
+    def add(self, commands, received, sent):
+        with self.lock:
+            self.requests += 1
+            self.commands += commands
+            self.bytes_received += received
+            self.bytes_sent += sent
+
+    def todict(self):
+        return dict(requests=self.requests, commands=self.commands,
+                    bytes_received=self.bytes_received,
+                    bytes_sent=self.bytes_sent)
+
+
+class EapiRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        length = int(self.headers.getheader('content-length', 0))
+        body = self.rfile.read(length)
+        response = self.server.dispatch(body)
+
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args):
+        pass
+
+
+class EapiServerMixin(object):
+
+    def dispatch(self, body):
+        request = json.loads(body)
+        params = request.get('params', dict())
+        commands = params.get('cmds', list())
+        encoding = params.get('format', 'json')
+
+        response = dict(jsonrpc='2.0', id=request.get('id'))
+        try:
+            if request.get('method') != 'runCmds':
+                raise CommandError(-32601, 'Method not found')
+            response['result'] = self.backend.execute(commands, encoding)
+        except CommandError as exc:
+            data = list(exc.output)
+            data.append(dict(errors=exc.errors))
+            response['error'] = dict(code=exc.code, message=exc.message,
+                                     data=data)
+
+        response = json.dumps(response)
+        self.stats.add(len(commands), len(body), len(response))
+        return response
+
+
+class EapiHttpServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer,
+                     EapiServerMixin):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class EapiUnixServer(SocketServer.ThreadingMixIn,
+                     SocketServer.UnixStreamServer, EapiServerMixin):
+
+    daemon_threads = True
+
+
+class FakeEapi(object):
+    """Runs the eAPI stand-in in a background thread
+
+    Args:
+        backend (Backend): The backend answering the eAPI commands
+        transport (str): Either "http" or "socket"
+        port (int): The TCP port for the http transport, 0 picks a free port
+        path (str): The Unix socket path for the socket transport
+
+    """
+
+    def __init__(self, backend=None, transport='http', port=0, path=None):
+        self.backend = backend or Backend(generator.canned_config())
+        self.transport = transport
+        self.stats = Stats()
+
+        if transport == 'socket':
+            self.path = path or '/tmp/ansible-eos-eapi.%s.sock' % os.getpid()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            self.server = EapiUnixServer(self.path, EapiRequestHandler)
+        else:
+            self.server = EapiHttpServer(('127.0.0.1', port),
+                                         EapiRequestHandler)
+            self.port = self.server.server_address[1]
+
+        self.server.backend = self.backend
+        self.server.stats = self.stats
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.transport == 'socket' and os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def connection(self):
+        """Returns the eapi.conf connection settings for the server
+        """
+        if self.transport == 'socket':
+            return dict(transport='socket', path=self.path)
+        return dict(transport='http', host='127.0.0.1', port=self.port,
+                    username='admin', password='admin')
+
+    def write_config(self, filename, name='fake'):
+        """Writes an eapi.conf file with a connection to the server
+        """
+        with open(filename, 'w') as fh:
+            fh.write('[connection:%s]\n' % name)
+            for key, value in sorted(self.connection().items()):
+                fh.write('%s: %s\n' % (key, value))
+        return filename
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--socket', help='serve on this Unix socket path')
+    parser.add_argument('--config', help='running-config file to serve')
+    parser.add_argument('--lines', type=int, default=0,
+                        help='pad the running-config to this many lines')
+    parser.add_argument('--profile', choices=sorted(generator.PROFILES),
+                        help='serve a synthetic config of this profile')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the synthetic config')
+    parser.add_argument('--emulate', action='store_true',
+                        help='apply configuration commands to the config')
+    args = parser.parse_args()
+
+    responses = dict()
+    if args.profile:
+        synthetic = generator.Synthetic.profile(args.profile, args.seed)
+        config = synthetic.running_config()
+        responses = synthetic.responses()
+    else:
+        config = open(args.config).read() if args.config else None
+        config = generator.running_config(args.lines, config)
+
+    backend = Backend(config, responses)
+    if args.emulate:
+        from perf.emulator import EmulatorBackend
+        backend = EmulatorBackend(config, responses)
+
+    transport = 'socket' if args.socket else 'http'
+    server = FakeEapi(backend, transport, args.port, args.socket)
+    print 'serving eAPI on %s' % server.connection()
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,656 @@
+"""In-memory EOS config emulator
+
+The emulator keeps the running-config as a tree of config blocks and
+applies the configuration commands sent by the modules to it, so show
+running-config requests return the configuration as the switch would after
+the commands were applied.  It can be used in process through a pyeapi
+Node, with the "emulator" transport registered in pyeapi, or behind the
+fake eAPI server.
+
+    >>> from perf import emulator
+    >>> node = emulator.node()
+    >>> node.config(['vlan 300', 'name blue'])
+    [{}, {}]
+    >>> node.api('vlans').get('300')['name']
+    'blue'
+
+The emulator models the config hierarchy and the replacement rules of the
+commands emitted by the pyeapi resource modules (vlan, interface, switchport,
+ip interface, vrrp, vxlan, mlag, ip route, router bgp, route-map, ip
+access-list, username, ...).  It does not validate commands against the EOS
+CLI grammar and JSON show command responses remain canned.
+"""
+import re
+import json
+import threading
+
+import pyeapi
+
+from perf import generator
+from perf.eapi_server import Backend, CommandError, Stats
+
+INDENT = '   '
+
+# Commands that open a config mode from the global config mode
+MODES = [re.compile(r) for r in [
+    r'^interface \S+$',
+    r'^vlan \d+$',
+    r'^router bgp \d+$',
+    r'^route-map \S+ (?:permit|deny) \d+$',
+    r'^ip access-list (?:standard )?\S+$',
+    r'^mlag configuration$',
+    r'^management (?:api http-commands|ssh)$',
+    r'^(?:system )?control-plane$',
+    r'^router ospf \d+$',
+]]
+
+# Commands that open a config mode nested in another mode
+NESTED_MODES = [(re.compile(p), re.compile(c)) for p, c in [
+    (r'^router bgp ', r'^address-family \S+$'),
+    (r'^router bgp ', r'^vrf \S+$'),
+    (r'^management api ', r'^vrf \S+$'),
+]]
+
+# Commands only valid in the global config mode, they leave any mode
+GLOBAL = re.compile(r'^(?:hostname|username|ip route|ip routing|'
+                    r'ip virtual-router mac-address|ip domain-name|'
+                    r'ip name-server|ntp|snmp-server|logging|'
+                    r'spanning-tree mode|enable secret|aaa)\b')
+
+# Each command is identified by a key, a command replaces the lines with
+# the same key in its block.  Keys with negate set are shown as "no <key>"
+# in the running-config when negated, the others are removed.
+KEYS = [(re.compile(r), negate) for r, negate in [
+    (r'^(description|name|state|mtu|load-interval|router-id|domain-id|'
+     r'local-interface|peer-address|peer-link|heartbeat-interval|'
+     r'reload-delay|maximum-paths|hostname|ip domain-name|continue|'
+     r'mlag)\b', True),
+    (r'^(shutdown|switchport|sflow enable|ip routing|private-vlan|'
+     r'spanning-tree portfast(?: auto)?|spanning-tree bpduguard|'
+     r'port-channel lacp fallback)$', True),
+    (r'^(switchport (?:mode|access vlan|trunk native vlan|'
+     r'trunk allowed vlan))\b', False),
+    (r'^(switchport trunk group \S+)', False),
+    (r'^(trunk group \S+)', False),
+    (r'^(flowcontrol (?:send|receive))\b', False),
+    (r'^(channel-group)\b', False),
+    (r'^(port-channel min-links)\b', False),
+    (r'^(ip address \S+ secondary)', False),
+    (r'^(ip address)\b', True),
+    (r'^(ip access-group) \S+(?: (.+))?$', False),
+    (r'^(ip virtual-router address \S+)', False),
+    (r'^(ip virtual-router mac-address)\b', False),
+    (r'^(vxlan (?:source-interface|multicast-group|udp-port))\b', False),
+    (r'^(vxlan vlan \d+ vni)\b', False),
+    (r'^(vxlan(?: vlan \d+)? flood vtep)\b', False),
+    (r'^(vrrp \d+ ip \S+ secondary)', False),
+    (r'^(vrrp \d+ (?:priority|description|timers advertise|'
+     r'preempt delay minimum|preempt delay reload|delay reload|'
+     r'mac-address advertisement-interval|ip version|authentication|'
+     r'preempt|shutdown|ip))\b', False),
+    (r'^(neighbor \S+ route-map \S+ (?:in|out))$', False),
+    (r'^(neighbor \S+ (?:remote-as|peer-group|description|send-community|'
+     r'next-hop-self|shutdown|maximum-routes|update-source|'
+     r'ebgp-multihop))\b', False),
+    (r'^(network \S+)', False),
+    (r'^(username \S+ sshkey)\b', False),
+    (r'^(username \S+)', False),
+    (r'^(ip route \S+ \S+(?: \d+\.\d+\.\d+\.\d+)?)', False),
+    (r'^(\d+)\b', False),
+]]
+
+# Commands adding to or removing from a list of values
+LISTS = re.compile(r'^(switchport trunk allowed vlan|'
+                   r'vxlan(?: vlan \d+)? flood vtep) (add|remove) (.+)$')
+
+# Lines kept sorted by EOS within a block
+SORTED = re.compile(r'^(?:switchport )?trunk group ')
+
+USERNAME_RE = re.compile(r'^username (\S+)(?: (.+))?$')
+
+VRRP_RE = re.compile(r'^vrrp (\d+) ')
+
+PORT_CHANNEL_RE = re.compile(r'^show port-channel (\d+) all-ports$')
+
+
+def expand_vlans(value):
+    """Returns the list of vlan ids of a vlan range string
+    """
+    if value == 'none':
+        return list()
+    if value == 'all':
+        value = '1-4094'
+    vlans = list()
+    for item in value.split(','):
+        start, _, end = item.partition('-')
+        vlans.extend(range(int(start), int(end or start) + 1))
+    return vlans
+
+
+def compress_vlans(vlans):
+    """Returns the vlan range string of a list of vlan ids
+    """
+    ranges = list()
+    for vid in sorted(set(vlans)):
+        if ranges and ranges[-1][1] == vid - 1:
+            ranges[-1][1] = vid
+        else:
+            ranges.append([vid, vid])
+    if not ranges:
+        return 'none'
+    return ','.join([str(a) if a == b else '%s-%s' % (a, b)
+                     for a, b in ranges])
+
+
+def _vlan(match):
+    vid = int(match.group(1))
+    return ['name VLAN%04d' % vid, 'mac address learning', 'state active',
+            'no private-vlan']
+
+_switched = ['no description', 'no shutdown', 'default load-interval',
+             'mtu 9214', 'switchport access vlan 1',
+             'switchport trunk native vlan 1',
+             'switchport trunk allowed vlan 1-4094',
+             'switchport mode access', 'switchport mac address learning',
+             'switchport', 'no spanning-tree portfast',
+             'spanning-tree portfast auto', 'no spanning-tree bpduguard']
+
+_routed = ['no description', 'no shutdown', 'default load-interval']
+
+_vrrp = ['priority 100', 'timers advertise 1',
+         'mac-address advertisement-interval 30', 'preempt',
+         'preempt delay minimum 0', 'preempt delay reload 0', 'delay reload 0',
+         'no authentication', 'ipv6 ::', 'no description', 'no shutdown',
+         'ip version 2']
+
+# Lines added to new blocks, as shown by show running-config all
+TEMPLATES = [(re.compile(r), func) for r, func in [
+    (r'^vlan (\d+)$', _vlan),
+    (r'^interface Ethernet', lambda m: _switched[:4] + [
+        'flowcontrol send off', 'flowcontrol receive off'] +
+        _switched[4:10] + ['sflow enable'] + _switched[10:]),
+    (r'^interface Port-Channel', lambda m: _switched[:10] + [
+        'port-channel min-links 0', 'no port-channel lacp fallback',
+        'no mlag'] + _switched[10:]),
+    (r'^interface Loopback', lambda m: _routed + ['mtu 65535']),
+    (r'^interface Vlan', lambda m: _routed + ['mtu 1500']),
+    (r'^interface Vxlan', lambda m: [
+        'no description', 'no shutdown', 'vxlan multicast-group 0.0.0.0',
+        'vxlan udp-port 4789']),
+    (r'^router bgp ', lambda m: ['no shutdown']),
+]]
+
+
+def command_key(command):
+    """Returns the key of a command and whether it is shown negated
+
+    Returns:
+        tuple: The key identifying the lines replaced by the command and
+            True if the negated command is kept as a "no <key>" line
+
+    """
+    if command.startswith('no '):
+        command = command[3:]
+    elif command.startswith('default '):
+        command = command[8:]
+    for regex, negate in KEYS:
+        match = regex.match(command)
+        if match:
+            return (' '.join(g for g in match.groups() if g), negate)
+    return (command, False)
+
+
+class Block(object):
+    """A line of the config and the lines nested under it
+    """
+
+    def __init__(self, line):
+        self.line = line
+        self.key = command_key(line)[0] if line else None
+        self.children = list()
+
+    def find(self, line):
+        for child in self.children:
+            if child.line == line:
+                return child
+
+    def keyed(self, key):
+        """Returns the index of the children with the key
+        """
+        return [i for i, child in enumerate(self.children)
+                if child.key == key]
+
+    def remove(self, command):
+        """Removes the children matching the command or prefixed by it
+        """
+        key = command_key(command)[0]
+        self.children = [c for c in self.children
+                         if c.key != key and
+                         not c.line.startswith(command + ' ')]
+
+    def set(self, line):
+        """Sets the line replacing the children with the same key
+        """
+        indexes = self.keyed(command_key(line)[0])
+        if indexes:
+            self.children[indexes[0]] = Block(line)
+            for index in reversed(indexes[1:]):
+                del self.children[index]
+        elif SORTED.match(line):
+            index = len(self.children)
+            for i, child in enumerate(self.children):
+                if SORTED.match(child.line) and child.line > line:
+                    index = i
+                    break
+            self.children.insert(index, Block(line))
+        else:
+            self.children.append(Block(line))
+
+    def value(self, key):
+        """Returns the value of the child with the key
+        """
+        for index in self.keyed(key):
+            line = self.children[index].line
+            if not line.startswith('no '):
+                return line[len(key):].strip()
+
+
+class Config(object):
+    """Hierarchical model of an EOS running-config
+
+    Args:
+        text (str): The running-config to load
+
+    """
+
+    def __init__(self, text=''):
+        self.root = Block(None)
+        self._rendered = None
+        self.load(text)
+
+    def load(self, text):
+        stack = [(-1, self.root)]
+        for line in text.split('\n'):
+            stripped = line.strip()
+            if not stripped or stripped.startswith('!') or stripped == 'end':
+                continue
+            depth = (len(line) - len(line.lstrip(' '))) // len(INDENT)
+            while stack[-1][0] >= depth:
+                stack.pop()
+            block = Block(stripped)
+            stack[-1][1].children.append(block)
+            stack.append((depth, block))
+        self._rendered = None
+
+    def render(self):
+        if self._rendered is not None:
+            return self._rendered
+
+        lines = list()
+
+        def walk(block, depth):
+            for child in block.children:
+                lines.append(INDENT * depth + child.line)
+                walk(child, depth + 1)
+
+        children = self.root.children
+        for index, block in enumerate(children):
+            lines.append(block.line)
+            walk(block, 1)
+            following = children[index + 1] if index + 1 < len(children) \
+                else None
+            if block.children or following is None or following.children \
+                    or self.kind(following.line) != self.kind(block.line):
+                lines.append('!')
+        lines.append('end')
+
+        self._rendered = '\n'.join(lines)
+        return self._rendered
+
+    def kind(self, line):
+        words = line.split()
+        return ' '.join(words[:2]) if words[0] in ['ip', 'no'] else words[0]
+
+    def create(self, parent, line):
+        """Creates a mode block with its default lines
+        """
+        block = Block(line)
+        for regex, func in TEMPLATES:
+            match = regex.match(line)
+            if match:
+                block.children = [Block(l) for l in func(match)]
+                break
+
+        self.insert(parent, block)
+        return block
+
+    def insert(self, parent, block):
+        """Inserts a block after the last global block of the same kind
+        """
+        index = len(parent.children)
+        if parent is self.root:
+            kinds = [i for i, c in enumerate(parent.children)
+                     if self.kind(c.line) == self.kind(block.line)]
+            if kinds:
+                index = kinds[-1] + 1
+        parent.children.insert(index, block)
+
+    def session(self):
+        return Session(self)
+
+
+class Session(object):
+    """Applies configuration commands, tracking the current config mode
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.stack = [config.root]
+
+    def mode(self, command):
+        """Returns the parent block if the command opens a mode
+        """
+        for regex in MODES:
+            if regex.match(command):
+                return self.config.root
+        for block in reversed(self.stack[1:]):
+            for parent, child in NESTED_MODES:
+                if parent.match(block.line) and child.match(command):
+                    self.stack = self.stack[:self.stack.index(block) + 1]
+                    return block
+
+    def apply(self, command):
+        command = command.strip()
+        if not command or command.startswith('!'):
+            return
+        if command == 'end':
+            self.stack = [self.config.root]
+            return
+        if command == 'exit':
+            if len(self.stack) > 1:
+                self.stack.pop()
+            return
+
+        self.config._rendered = None
+
+        negated = command.startswith('no ')
+        default = command.startswith('default ')
+        line = command[3:] if negated else command
+        line = line[8:] if default else line
+
+        parent = self.mode(line)
+        if parent is not None:
+            if parent is self.config.root:
+                self.stack = [parent]
+            if negated or default:
+                parent.remove(line)
+                if default and parent is self.config.root:
+                    self.config.create(parent, line)
+                return
+            block = parent.find(line) or self.config.create(parent, line)
+            self.stack.append(block)
+            return
+
+        if GLOBAL.match(line):
+            self.stack = [self.config.root]
+
+        block = self.stack[-1]
+
+        match = LISTS.match(line)
+        if match and not negated:
+            return self.apply_list(block, *match.groups())
+
+        match = USERNAME_RE.match(line)
+        if match and not line.startswith('username %s sshkey' %
+                                         match.group(1)):
+            return self.apply_username(block, match.group(1),
+                                       match.group(2), negated, default)
+
+        if line == 'switchport' and not negated and \
+                not block.keyed('switchport mode'):
+            for default_line in _switched[4:8]:
+                block.set(default_line)
+
+        match = VRRP_RE.match(line)
+        if match:
+            self.apply_vrrp(block, match.group(1))
+
+        (key, negate) = command_key(line)
+        if negated:
+            if negate:
+                block.set('no %s' % key)
+            else:
+                block.remove(line)
+        elif default:
+            block.remove(line)
+        elif block is self.config.root and not block.keyed(key):
+            self.config.insert(block, Block(line))
+        else:
+            block.set(line)
+
+
+    def apply_vrrp(self, block, vrid):
+        """Adds the default lines of a new vrrp group to the block
+        """
+        prefix = 'vrrp %s ' % vrid
+        if [c for c in block.children if c.key.startswith(prefix)]:
+            return
+        for line in _vrrp:
+            if line.startswith('no '):
+                block.set('no %s%s' % (prefix, line[3:]))
+            else:
+                block.set(prefix + line)
+
+    def apply_list(self, block, key, action, value):
+        current = block.value(key) or ''
+        if key.startswith('switchport'):
+            vlans = set(expand_vlans(current or 'all'))
+            values = set(expand_vlans(value))
+            vlans = vlans | values if action == 'add' else vlans - values
+            block.set('%s %s' % (key, compress_vlans(vlans)))
+            return
+
+        values = current.split()
+        for item in value.split():
+            if action == 'add' and item not in values:
+                values.append(item)
+            elif action == 'remove' and item in values:
+                values.remove(item)
+        if values:
+            block.set('%s %s' % (key, ' '.join(values)))
+        else:
+            block.remove(key)
+
+    def apply_username(self, block, name, options, negated, default):
+        """Merges the username options into the single username line
+        """
+        key = 'username %s' % name
+        if (negated or default) and not options:
+            block.remove(key)
+            return
+
+        attrs = self.username_options(block.value(key) or '')
+        updates = self.username_options(options or '')
+        if negated:
+            for option in updates:
+                attrs.pop(option, None)
+        else:
+            if 'nopassword' in updates or 'secret' in updates:
+                attrs.pop('nopassword', None)
+                attrs.pop('secret', None)
+            attrs.update(updates)
+
+        line = [key, 'privilege', attrs.get('privilege', '1')]
+        for option in ['role', 'secret']:
+            if option in attrs:
+                line.extend([option, attrs[option]])
+        if 'nopassword' in attrs:
+            line.append('nopassword')
+        line = ' '.join(line)
+        if block.keyed(key):
+            block.set(line)
+        else:
+            self.config.insert(block, Block(line))
+
+    def username_options(self, options):
+        attrs = dict()
+        words = options.split()
+        while words:
+            word = words.pop(0)
+            if word == 'nopassword':
+                attrs[word] = True
+            elif word == 'secret':
+                attrs[word] = ' '.join(words[:2]) if len(words) > 1 \
+                    else words[0]
+                words = words[2:]
+            elif words:
+                attrs[word] = words.pop(0)
+            else:
+                attrs[word] = None
+        return attrs
+
+
+class EmulatorBackend(Backend):
+    """Fake eAPI backend that applies configuration to a Config model
+    """
+
+    def __init__(self, running_config='', responses=None):
+        self.lock = threading.RLock()
+        self.stats = Stats()
+        self._session = None
+        super(EmulatorBackend, self).__init__(running_config, responses)
+
+    @property
+    def running_config(self):
+        return self.config.render()
+
+    @running_config.setter
+    def running_config(self, value):
+        self.config = Config(value)
+
+    def execute(self, commands, encoding='json'):
+        with self.lock:
+            self._session = self.config.session()
+            return super(EmulatorBackend, self).execute(commands, encoding)
+
+    def configure(self, command):
+        if command != 'enable':
+            self._session.apply(command)
+        return dict()
+
+    def show(self, command, encoding):
+        match = PORT_CHANNEL_RE.match(command)
+        if match and encoding == 'text':
+            return dict(output=self.port_channel(match.group(1)))
+        return super(EmulatorBackend, self).show(command, encoding)
+
+    def port_channel(self, group):
+        """Returns the port-channel members from the channel-group lines
+        """
+        prefix = 'channel-group %s mode ' % group
+        members = [b.line.split()[1] for b in self.config.root.children
+                   if b.line.startswith('interface ') and
+                   [c for c in b.children if c.line.startswith(prefix)]]
+        return 'Port Channel Port-Channel%s:\n  Active Ports: %s\n' % \
+            (group, ' '.join(members))
+
+
+class EmulatorConnection(object):
+    """pyeapi connection that sends the requests to an emulator backend
+
+    The connection is registered as the "emulator" pyeapi transport by
+    install().  The host setting selects the backend in BACKENDS, a new
+    backend is created from the canned running-config for unknown hosts.
+    Requests and bytes are counted in the stats of the backend.
+    """
+
+    def __init__(self, host='emulator', backend=None, **kwargs):
+        if backend is None:
+            if host not in BACKENDS:
+                BACKENDS[host] = EmulatorBackend(generator.canned_config())
+            backend = BACKENDS[host]
+        self.host = host
+        self.backend = backend
+        self.error = None
+
+    def __str__(self):
+        return 'Emulator(host=%s)' % self.host
+
+    def execute(self, commands, encoding='json', **kwargs):
+        request = json.dumps(dict(cmds=commands, format=encoding))
+        try:
+            result = self.backend.execute(commands, encoding)
+        except CommandError as exc:
+            self.error = exc
+            self.backend.stats.add(len(commands), len(request),
+                                   len(exc.message))
+            raise pyeapi.eapilib.CommandError(exc.code, exc.message,
+                                              command_error=exc.errors[0],
+                                              output=exc.output,
+                                              commands=commands)
+        response = dict(jsonrpc='2.0', result=result, id=id(self))
+        self.backend.stats.add(len(commands), len(request),
+                               len(json.dumps(result)))
+        return response
+
+
+BACKENDS = dict()
+
+
+def install():
+    """Registers the emulator as the "emulator" pyeapi transport
+    """
+    pyeapi.client.TRANSPORTS['emulator'] = EmulatorConnection
+
+
+def node(running_config=None, autorefresh=True):
+    """Returns a pyeapi Node backed by a new emulator
+
+    Args:
+        running_config (str): The initial running-config, the canned
+            running-config by default
+        autorefresh (bool): Refreshes the running-config after changes
+
+    """
+    if running_config is None:
+        running_config = generator.canned_config()
+    backend = EmulatorBackend(running_config)
+    connection = EmulatorConnection(backend=backend)
+    return pyeapi.client.Node(connection, autorefresh=autorefresh)
+
+
+class Emulator(object):
+    """Serves an emulator backend to in-process module runs
+
+    Provides the interface of FakeEapi so the benchmarks can run the
+    modules against the emulator instead of a server.
+    """
+
+    def __init__(self, backend=None, name='emulator'):
+        self.backend = backend or EmulatorBackend(generator.canned_config())
+        self.stats = self.backend.stats
+        self.name = name
+
+    def start(self):
+        install()
+        BACKENDS[self.name] = self.backend
+        return self
+
+    def stop(self):
+        BACKENDS.pop(self.name, None)
+
+    def connection(self):
+        return dict(transport='emulator', host=self.name)
+
+    def write_config(self, filename, name='fake'):
+        with open(filename, 'w') as fh:
+            fh.write('[connection:%s]\n' % name)
+            for key, value in sorted(self.connection().items()):
+                fh.write('%s: %s\n' % (key, value))
+        return filename
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
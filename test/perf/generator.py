@@ -0,0 +1,360 @@
+"""Builds running-configs for the performance benchmarks
+
+running_config() pads the canned config to a number of lines.  Synthetic
+generates realistic configs and the matching show command responses at a
+configurable scale from a seed:
+
+    >>> config = Synthetic.profile('large', seed=1)
+    >>> len(config.running_config().split('\n'))
+    121066
+"""
+import os
+import random
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+CANNED_CONFIG = os.path.join(here, 'fixtures/running-config')
+
+INTERFACE = """interface Ethernet%(slot)s/%(port)s
+   description filler %(slot)s/%(port)s
+   no shutdown
+   default load-interval
+   mtu 9214
+   flowcontrol send off
+   flowcontrol receive off
+   switchport access vlan 1
+   switchport trunk native vlan 1
+   switchport trunk allowed vlan 1-4094
+   switchport mode access
+   switchport mac address learning
+   switchport
+   sflow enable
+   no spanning-tree portfast
+   spanning-tree portfast auto
+   no spanning-tree bpduguard
+!"""
+
+
+def canned_config():
+    """Returns the canned running-config used as the base config
+    """
+    return open(CANNED_CONFIG).read().strip()
+
+
+def canned_blocks(headers):
+    """Returns the canned config blocks starting with the header lines
+
+    Args:
+        headers (list): The first line of each block to return
+
+    Returns:
+        list: The lines of the blocks, each followed by a "!" line
+
+    """
+    config = canned_config().split('\n')
+    lines = list()
+    for header in headers:
+        index = config.index(header)
+        lines.append(header)
+        for line in config[index + 1:]:
+            if not line.startswith(' '):
+                break
+            lines.append(line)
+        lines.append('!')
+    return lines
+
+
+def running_config(lines, base=None):
+    """Returns a running-config padded to at least the number of lines
+
+    Filler Ethernet interfaces are inserted ahead of the final "end" of the
+    base config (the canned config by default) until the config reaches the
+    requested number of lines.
+
+    Args:
+        lines (int): The minimum number of lines of the config
+        base (str): The config to pad
+
+    Returns:
+        str: The running-config as a string
+
+    """
+    config = (base or canned_config()).split('\n')
+    if config[-1] == 'end':
+        config.pop()
+
+    stanza = len(INTERFACE.split('\n'))
+    count = max(0, lines - len(config) - 1)
+    for index in range((count + stanza - 1) // stanza):
+        slot, port = divmod(index, 48)
+        config.append(INTERFACE % dict(slot=slot + 10, port=port + 1))
+
+    config.append('end')
+    return '\n'.join(config)
+
+
+PROFILES = {
+    'small': dict(vlans=100, interfaces=48, routes=1000, acl_entries=100,
+                  bgp_neighbors=10),
+    'medium': dict(vlans=1000, interfaces=480, routes=10000,
+                   acl_entries=1000, bgp_neighbors=100),
+    'large': dict(vlans=4094, interfaces=2000, routes=50000,
+                  acl_entries=10000, bgp_neighbors=1000),
+}
+
+BASE_BLOCKS = ['interface Port-Channel1', 'interface Ethernet1',
+               'interface Ethernet2', 'interface Ethernet3',
+               'interface Vlan100', 'interface Vxlan1', 'mlag configuration']
+
+ACL_SIZE = 1000
+BGP_AS = 65000
+
+
+class Synthetic(object):
+    """Generates a consistent running-config and show command responses
+
+    The same seed and counts always produce the same config so benchmark
+    runs can be compared.  VLANs are numbered from 1, interfaces are
+    Ethernet<slot>/<port> with 48 ports per slot, static routes are /24
+    prefixes of 10.0.0.0/8, ACL entries are spread over standard ACLs of
+    1000 entries and BGP neighbors are numbered from 10.254.0.1.  The
+    resources the benchmark cases use, Ethernet1 to Ethernet3,
+    Port-Channel1, Vlan100, Vxlan1 and the mlag configuration, are copied
+    from the canned config into every config.
+
+    Args:
+        seed (int): The seed of the random choices
+        vlans (int): The number of VLANs
+        interfaces (int): The number of Ethernet interfaces
+        routes (int): The number of static routes
+        acl_entries (int): The number of standard ACL entries
+        bgp_neighbors (int): The number of BGP neighbors
+
+    """
+
+    def __init__(self, seed=0, vlans=0, interfaces=0, routes=0,
+                 acl_entries=0, bgp_neighbors=0):
+        self.seed = seed
+        self.counts = dict(vlans=min(vlans, 4094), interfaces=interfaces,
+                           routes=min(routes, 65536), acl_entries=acl_entries,
+                           bgp_neighbors=min(bgp_neighbors, 65534))
+        self.random = random.Random(seed)
+        self.vlans = self._vlans()
+        self.interfaces = self._interfaces()
+        self.routes = self._routes()
+        self.acls = self._acls()
+        self.neighbors = self._neighbors()
+
+    @classmethod
+    def profile(cls, name, seed=0):
+        return cls(seed, **PROFILES[name])
+
+    def _vlans(self):
+        vlans = list()
+        for vid in range(1, self.counts['vlans'] + 1):
+            suspended = vid != 1 and self.random.random() < 0.05
+            groups = ['tg%s' % (vid % 8)] if self.random.random() < 0.1 \
+                else list()
+            vlans.append(dict(vid=vid, name='VLAN%04d' % vid,
+                              state='suspend' if suspended else 'active',
+                              trunk_groups=groups))
+        return vlans
+
+    def _interfaces(self):
+        vids = [v['vid'] for v in self.vlans] or [1]
+        interfaces = list()
+        for index in range(self.counts['interfaces']):
+            slot, port = divmod(index, 48)
+            name = 'Ethernet%s/%s' % (slot + 1, port + 1)
+            kind = self.random.choice(['access', 'access', 'trunk', 'routed'])
+            interfaces.append(dict(
+                name=name, kind=kind,
+                description='synthetic %s' % name.lower(),
+                shutdown=self.random.random() < 0.1,
+                access_vlan=self.random.choice(vids),
+                address='172.%s.%s.1/30' % (16 + index // 65536 % 16,
+                                            index // 256 % 256) if
+                kind == 'routed' else None))
+        return interfaces
+
+    def _routes(self):
+        prefixes = self.random.sample(xrange(65536), self.counts['routes'])
+        routes = list()
+        for value in prefixes:
+            hop = self.random.randint(1, 254)
+            routes.append(dict(prefix='10.%s.%s.0/24' % divmod(value, 256),
+                               next_hop='192.168.%s.%s' % (hop % 4, hop),
+                               tag=self.random.choice([0, 0, 0, 100])))
+        return routes
+
+    def _acls(self):
+        acls = list()
+        for index in range(0, self.counts['acl_entries'], ACL_SIZE):
+            count = min(ACL_SIZE, self.counts['acl_entries'] - index)
+            entries = list()
+            for seqno in range(10, (count + 1) * 10, 10):
+                action = 'deny' if self.random.random() < 0.2 else 'permit'
+                masklen = self.random.choice([8, 16, 24, 32])
+                address = '.'.join([str(self.random.randint(1, 223))] +
+                                   [str(self.random.randint(0, 255))
+                                    for _ in range(3)])
+                entries.append(dict(seqno=seqno, action=action,
+                                    address=address, masklen=masklen,
+                                    log=self.random.random() < 0.05))
+            acls.append(dict(name='ACL_%s' % (index // ACL_SIZE),
+                             entries=entries))
+        return acls
+
+    def _neighbors(self):
+        neighbors = list()
+        for index in range(self.counts['bgp_neighbors']):
+            address = '10.254.%s.%s' % divmod(index + 1, 256)
+            neighbors.append(dict(
+                address=address, remote_as=self.random.randint(65001, 65500),
+                description='peer%s' % index,
+                state=self.random.choice(['Established'] * 9 + ['Active'])))
+        return neighbors
+
+    def running_config(self):
+        """Returns the running-config as a string
+        """
+        lines = ['hostname synthetic', 'ip domain-name example.com', '!',
+                 'spanning-tree mode mstp', '!',
+                 'username admin privilege 15 role network-admin nopassword',
+                 '!']
+
+        for vlan in self.vlans:
+            lines.append('vlan %s' % vlan['vid'])
+            lines.append('   name %s' % vlan['name'])
+            lines.append('   mac address learning')
+            lines.append('   state %s' % vlan['state'])
+            lines.append('   no private-vlan')
+            for group in vlan['trunk_groups']:
+                lines.append('   trunk group %s' % group)
+            lines.append('!')
+
+        for intf in self.interfaces:
+            lines.append('interface %s' % intf['name'])
+            lines.append('   description %s' % intf['description'])
+            lines.append('   %sshutdown' % ('' if intf['shutdown'] else 'no '))
+            lines.append('   default load-interval')
+            lines.append('   mtu 9214')
+            lines.append('   flowcontrol send off')
+            lines.append('   flowcontrol receive off')
+            if intf['kind'] == 'routed':
+                lines.append('   no switchport')
+                lines.append('   ip address %s' % intf['address'])
+            else:
+                lines.append('   switchport access vlan %s' %
+                             intf['access_vlan'])
+                lines.append('   switchport trunk native vlan 1')
+                lines.append('   switchport trunk allowed vlan 1-4094')
+                lines.append('   switchport mode %s' % intf['kind'])
+                lines.append('   switchport mac address learning')
+                lines.append('   switchport')
+            lines.append('   sflow enable')
+            lines.append('   no spanning-tree portfast')
+            lines.append('   spanning-tree portfast auto')
+            lines.append('   no spanning-tree bpduguard')
+            lines.append('!')
+
+        lines.extend(['interface Loopback0', '   no description',
+                      '   no shutdown', '   default load-interval',
+                      '   mtu 65535', '   ip address 1.1.1.1/32', '!',
+                      'interface Management1', '   no description',
+                      '   no shutdown', '   default load-interval',
+                      '   mtu 1500', '   ip address 192.168.1.16/24', '!'])
+        lines.extend(canned_blocks(BASE_BLOCKS))
+
+        for acl in self.acls:
+            lines.append('ip access-list standard %s' % acl['name'])
+            for entry in acl['entries']:
+                lines.append('   %s %s %s/%s%s' % (
+                    entry['seqno'], entry['action'], entry['address'],
+                    entry['masklen'], ' log' if entry['log'] else ''))
+            lines.append('!')
+
+        for route in self.routes:
+            line = 'ip route %s %s 1' % (route['prefix'], route['next_hop'])
+            if route['tag']:
+                line += ' tag %s' % route['tag']
+            lines.append(line)
+        lines.extend(['!', 'ip routing', '!'])
+
+        if self.neighbors:
+            lines.append('router bgp %s' % BGP_AS)
+            lines.append('   router-id 1.1.1.1')
+            lines.append('   maximum-paths 32 ecmp 32')
+            lines.append('   no shutdown')
+            for peer in self.neighbors:
+                lines.append('   neighbor %s remote-as %s' %
+                             (peer['address'], peer['remote_as']))
+                lines.append('   neighbor %s description %s' %
+                             (peer['address'], peer['description']))
+            lines.append('   network 1.1.1.1/32')
+            lines.append('!')
+
+        lines.extend(['management api http-commands', '   no shutdown', '!',
+                      'end'])
+        return '\n'.join(lines)
+
+    def responses(self):
+        """Returns the show command JSON responses matching the config
+
+        Returns:
+            dict: The responses keyed by command, including the per VLAN and
+                per interface commands used by the JSON instance readers
+
+        """
+        responses = dict()
+
+        vlans = dict()
+        for vlan in self.vlans:
+            members = dict([(i['name'], dict(privatePromoted=False))
+                            for i in self.interfaces
+                            if i['kind'] == 'access' and
+                            i['access_vlan'] == vlan['vid']])
+            vlans[str(vlan['vid'])] = dict(
+                name=vlan['name'], dynamic=False, interfaces=members,
+                status='suspended' if vlan['state'] == 'suspend'
+                else 'active')
+            responses['show vlan %s' % vlan['vid']] = dict(
+                vlans={str(vlan['vid']): vlans[str(vlan['vid'])]},
+                sourceDetail='')
+            responses['show vlan %s trunk group' % vlan['vid']] = dict(
+                trunkGroups={str(vlan['vid']): dict(
+                    names=vlan['trunk_groups'])})
+        responses['show vlan'] = dict(vlans=vlans, sourceDetail='')
+
+        interfaces = dict()
+        for intf in self.interfaces:
+            interfaces[intf['name']] = dict(
+                name=intf['name'], description=intf['description'],
+                interfaceStatus='disabled' if intf['shutdown']
+                else 'connected',
+                lineProtocolStatus='down' if intf['shutdown'] else 'up',
+                forwardingModel='routed' if intf['kind'] == 'routed'
+                else 'bridged',
+                mtu=9214, bandwidth=10000000000)
+            responses['show interfaces %s' % intf['name']] = dict(
+                interfaces={intf['name']: interfaces[intf['name']]})
+        responses['show interfaces'] = dict(interfaces=interfaces)
+
+        peers = dict()
+        for peer in self.neighbors:
+            established = peer['state'] == 'Established'
+            peers[peer['address']] = dict(
+                peerState=peer['state'], asn=str(peer['remote_as']),
+                prefixReceived=self.random.randint(1, 1000)
+                if established else 0,
+                prefixAccepted=0, version=4, msgReceived=0, msgSent=0,
+                inMsgQueue=0, outMsgQueue=0,
+                upDownTime=1445432112.66 + self.random.randint(0, 86400),
+                underMaintenance=False)
+        responses['show ip bgp summary'] = dict(vrfs=dict(default=dict(
+            routerId='1.1.1.1', asn=str(BGP_AS), vrf='default',
+            peers=peers)))
+
+        responses['show hostname'] = dict(hostname='synthetic',
+                                          fqdn='synthetic.example.com')
+        return responses
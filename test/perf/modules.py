@@ -0,0 +1,135 @@
+import os
+import sys
+import json
+import time
+import StringIO
+
+import pyeapi
+
+from ansible.module_utils import basic
+
+here = os.path.abspath(os.path.dirname(__file__))
+library = os.path.abspath(os.path.join(here, '../../library'))
+
+_compiled = dict()
+
+
+class EapiCounter(object):
+    """Counts the eAPI requests and bytes sent by pyeapi connections
+
+    The counter wraps EapiConnection.send while it is installed so every
+    request made by a module, whatever the transport, is accounted for.
+    Response bytes are measured on the decoded response re-encoded as
+    JSON which matches the payload returned by the node.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.elapsed = 0.0
+        self._send = None
+
+    def install(self):
+        counter = self
+        send = pyeapi.eapilib.EapiConnection.send
+
+        def counted_send(connection, data):
+            start = time.time()
+            try:
+                response = send(connection, data)
+            finally:
+                counter.elapsed += time.time() - start
+                counter.requests += 1
+                counter.bytes_sent += len(data)
+            counter.bytes_received += len(json.dumps(response))
+            return response
+
+        self._send = send
+        pyeapi.eapilib.EapiConnection.send = counted_send
+
+    def uninstall(self):
+        if self._send:
+            pyeapi.eapilib.EapiConnection.send = self._send
+            self._send = None
+
+    def reset(self):
+        self.requests = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, *args):
+        self.uninstall()
+
+
+def compile_module(name):
+    """Compiles the library module without the trailing main() call
+    """
+    if name in _compiled:
+        return _compiled[name]
+
+    path = os.path.join(library, '%s.py' % name)
+    source = open(path).read().rstrip()
+    if source.endswith('main()'):
+        source = source[:-len('main()')]
+
+    _compiled[name] = compile(source, path, 'exec')
+    return _compiled[name]
+
+
+def load_module(name):
+    """Returns the namespace of the library module without running main
+    """
+    namespace = {'__name__': name}
+    exec compile_module(name) in namespace
+    return namespace
+
+
+def set_module_args(arguments, check_mode=False):
+    """Sets the arguments read by AnsibleModule for the next module run
+    """
+    arguments = dict(arguments)
+    if check_mode:
+        arguments['_ansible_check_mode'] = True
+    if hasattr(basic, '_ANSIBLE_ARGS'):
+        basic._ANSIBLE_ARGS = json.dumps(dict(ANSIBLE_MODULE_ARGS=arguments))
+    else:
+        basic.MODULE_ARGS = ''
+        basic.MODULE_COMPLEX_ARGS = json.dumps(arguments)
+
+
+def run_module(name, arguments, check_mode=False):
+    """Runs the library module main routine in the current process
+
+    Args:
+        name (str): The name of the module in library/ to run
+        arguments (dict): The module arguments
+        check_mode (bool): Runs the module in check mode if True
+
+    Returns:
+        tuple: The exit code and the decoded module result
+
+    """
+    set_module_args(arguments, check_mode)
+    namespace = load_module(name)
+
+    stdout = sys.stdout
+    sys.stdout = StringIO.StringIO()
+    exitcode = 0
+    try:
+        namespace['main']()
+    except SystemExit as exc:
+        exitcode = exc.code or 0
+    finally:
+        output = sys.stdout.getvalue()
+        sys.stdout = stdout
+
+    try:
+        return (exitcode, json.loads(output))
+    except ValueError:
+        return (exitcode, dict(failed=True, msg=output))
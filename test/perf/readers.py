@@ -0,0 +1,76 @@
+"""Compares the running-config and JSON instance readers
+
+Each case is run in check mode against a node from test/fixtures/eapi.conf
+with reader=config and reader=json.  For every run the wall time, the time
+spent waiting on eAPI, the time left for parsing and the number of
+requests and bytes exchanged with the node are reported.
+
+    $ cd test && python -m perf.readers --connection veos01
+"""
+import os
+import time
+import argparse
+
+from perf.modules import EapiCounter, run_module, here
+
+CASES = [
+    ('eos_vlan', dict(vlanid='1')),
+    ('eos_interface', dict(name='Ethernet1')),
+    ('eos_switchport', dict(name='Ethernet1')),
+    ('eos_portchannel', dict(name='Port-Channel1')),
+    ('eos_vxlan', dict(name='Vxlan1')),
+]
+
+READERS = ['config', 'json']
+
+
+def measure(module, arguments, iterations):
+    samples = list()
+    with EapiCounter() as counter:
+        for _ in range(iterations):
+            counter.reset()
+            start = time.time()
+            (exitcode, result) = run_module(module, arguments, check_mode=True)
+            elapsed = time.time() - start
+            if exitcode:
+                raise RuntimeError('%s failed: %s' % (module, result['msg']))
+            samples.append((elapsed, counter.elapsed, counter.requests,
+                            counter.bytes_sent + counter.bytes_received))
+
+    count = float(len(samples))
+    wall = sum([s[0] for s in samples]) / count
+    eapi = sum([s[1] for s in samples]) / count
+    return dict(wall=wall, eapi=eapi, parse=wall - eapi,
+                requests=samples[-1][2], bytes=samples[-1][3])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--connection', required=True,
+                        help='connection name from the eapi.conf file')
+    parser.add_argument('--config',
+                        default=os.path.join(here, '../fixtures/eapi.conf'))
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--module', action='append',
+                        help='only run the cases for this module')
+    args = parser.parse_args()
+
+    row = '%-16s %-7s %9s %9s %9s %5s %10s'
+    print row % ('module', 'reader', 'wall(ms)', 'eapi(ms)', 'parse(ms)',
+                 'reqs', 'bytes')
+
+    for module, arguments in CASES:
+        if args.module and module not in args.module:
+            continue
+        for reader in READERS:
+            params = dict(arguments, connection=args.connection,
+                          config=args.config, reader=reader, logging='false')
+            stats = measure(module, params, args.iterations)
+            print row % (module, reader, '%.1f' % (stats['wall'] * 1000),
+                         '%.1f' % (stats['eapi'] * 1000),
+                         '%.1f' % (stats['parse'] * 1000),
+                         stats['requests'], stats['bytes'])
+
+
+if __name__ == '__main__':
+    main()
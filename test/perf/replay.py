@@ -0,0 +1,96 @@
+"""Records and replays the eAPI requests of the benchmark cases
+
+With --record every case in perf.bench is run once against the node and the
+eAPI requests are written to one fixture file per module.  Without it the
+cases are replayed from the fixture files, so the module runs see exactly
+the recorded configs and latencies.  A case that sends a request that was
+not recorded fails and a case that leaves recorded requests unused is
+flagged, which shows when a change adds or removes a round trip.
+
+    $ cd test && python -m perf.replay --record --connection veos01
+    $ cd test && python -m perf.replay --latency recorded
+"""
+import os
+import time
+import argparse
+
+from perf.bench import CASES
+from perf.modules import run_module, here
+
+
+def fixture(directory, module):
+    return os.path.join(directory, '%s.jsonl' % module)
+
+
+def record(args):
+    for module, arguments in CASES:
+        if args.module and module not in args.module:
+            continue
+        params = dict(arguments, connection=args.connection,
+                      config=args.config, logging='false',
+                      record=fixture(args.fixtures, module))
+        (exitcode, result) = run_module(module, params, check_mode=True)
+        if exitcode:
+            status = 'FAILED: %s' % result.get('msg')
+        else:
+            status = 'skipped' if result.get('skipped') else ''
+        print '%-20s %5s %s' % (module, result.get('record', {}).get(
+            'requests', '-'), status)
+
+
+def replay(args):
+    row = '%-20s %9s %5s %5s %s'
+    print row % ('module', 'wall(ms)', 'reqs', 'rec', '')
+    for module, arguments in CASES:
+        if args.module and module not in args.module:
+            continue
+        filename = fixture(args.fixtures, module)
+        if not os.path.exists(filename):
+            continue
+        params = dict(arguments, logging='false', replay=filename,
+                      replay_latency=args.latency)
+        start = time.time()
+        (exitcode, result) = run_module(module, params, check_mode=True)
+        elapsed = time.time() - start
+
+        summary = result.get('replay', dict())
+        if exitcode:
+            status = 'FAILED: %s' % result.get('msg')
+        elif summary.get('unused'):
+            status = '%s recorded requests not sent' % summary['unused']
+        else:
+            status = ''
+        print row % (module, '%.1f' % (elapsed * 1000),
+                     summary.get('requests', '-'),
+                     summary.get('recorded', '-'), status)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--fixtures',
+                        default=os.path.join(here, 'fixtures/replay'),
+                        help='directory holding the fixture files')
+    parser.add_argument('--record', action='store_true',
+                        help='record the fixtures instead of replaying')
+    parser.add_argument('--connection',
+                        help='connection name from the eapi.conf file')
+    parser.add_argument('--config',
+                        default=os.path.join(here, '../fixtures/eapi.conf'))
+    parser.add_argument('--latency', default='none',
+                        help='none, recorded or a number of milliseconds')
+    parser.add_argument('--module', action='append',
+                        help='only run the case for this module')
+    args = parser.parse_args()
+
+    if args.record:
+        if not args.connection:
+            parser.error('--record requires --connection')
+        if not os.path.isdir(args.fixtures):
+            os.makedirs(args.fixtures)
+        record(args)
+    else:
+        replay(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Runs the YAML testcases in parallel across a pool of worker processes
+
+Testcases are grouped into work units that run serially inside a worker so
+their setup and teardown commands never collide.  With --isolation node
+(the default) a unit holds every testcase for one node.  With --isolation
+resource a unit holds the testcases for one node that share the same
+resource, which is the module name unless the testcase file sets a
+resource in its defaults.
+
+By default each module is run through the ansible CLI like nosetests does.
+With --in-process the module main routine is called in the worker process
+instead, which avoids starting ansible and python twice per testcase.
+
+    $ python test/runner.py --processes 8 --isolation resource --in-process
+"""
+import os
+import sys
+import copy
+import time
+import argparse
+import StringIO
+import traceback
+import multiprocessing
+
+from string import Template
+
+import pyeapi
+
+from test_module import TestModule, load_testcases, here
+
+
+class InProcessTestModule(TestModule):
+
+    def run_module(self):
+        from perf.modules import run_module
+
+        arguments = dict()
+        for arg in self.testcase.arguments:
+            value = Template(str(arg['value']))
+            arguments[arg['name']] = \
+                value.safe_substitute(self.testcase.variables)
+
+        self.output('arguments: %s' % arguments)
+        (retcode, response) = run_module(self.testcase.module, arguments)
+        self.output(response)
+
+        assert retcode == self.testcase.exitcode
+        return response
+
+
+def run_unit(unit):
+    """Runs the testcases of a work unit against a node
+
+    Returns:
+        list: A dict for each testcase with its name, module, node,
+            result, elapsed time and captured output
+
+    """
+    (name, testcases, config, in_process) = unit
+
+    os.environ['EAPI_CONF'] = config
+    pyeapi.load_config(config)
+    node = pyeapi.connect_to(name)
+    cls = InProcessTestModule if in_process else TestModule
+
+    results = list()
+    for testcase in testcases:
+        testcase = copy.deepcopy(testcase)
+        testcase.set_host(name)
+        testcase.add_variable('host', name)
+        test = cls(testcase, node)
+
+        stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+        start = time.time()
+        error = None
+        try:
+            test.setUp()
+            try:
+                test()
+            finally:
+                test.tearDown()
+        except Exception:
+            error = traceback.format_exc()
+        finally:
+            elapsed = time.time() - start
+            output = sys.stdout.getvalue()
+            sys.stdout = stdout
+
+        results.append(dict(name=testcase.name, module=testcase.module,
+                            node=name, elapsed=elapsed, error=error,
+                            output=output))
+    return results
+
+
+def build_units(names, testcases, isolation, config, in_process):
+    units = list()
+    for name in names:
+        groups = dict()
+        for testcase in testcases:
+            key = testcase.resource if isolation == 'resource' else None
+            groups.setdefault(key, list()).append(testcase)
+        for key in sorted(groups, key=str):
+            units.append((name, groups[key], config, in_process))
+    return units
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--config',
+                        default=os.path.join(here, 'fixtures/eapi.conf'))
+    parser.add_argument('--node', action='append',
+                        help='only run against this node from eapi.conf')
+    parser.add_argument('--modules',
+                        default=os.environ.get('ANSIBLE_TEST_CASES'),
+                        help='comma separated list of modules to test')
+    parser.add_argument('--processes', type=int,
+                        default=multiprocessing.cpu_count())
+    parser.add_argument('--isolation', default='node',
+                        choices=['node', 'resource'])
+    parser.add_argument('--in-process', action='store_true',
+                        help='call the module main routine in process')
+    parser.add_argument('--verbose', action='store_true',
+                        help='show the output of every testcase')
+    args = parser.parse_args()
+
+    pyeapi.load_config(args.config)
+    names = args.node or [n for n in pyeapi.client.config.connections
+                          if n != 'localhost']
+    assert len(names) > 0, 'no test nodes loaded, does eapi.conf exist?'
+
+    testcases = load_testcases(args.modules)
+    units = build_units(names, testcases, args.isolation, args.config,
+                        args.in_process)
+
+    start = time.time()
+    pool = multiprocessing.Pool(processes=min(args.processes, len(units)))
+    try:
+        results = [r for rs in pool.map(run_unit, units, 1) for r in rs]
+    finally:
+        pool.terminate()
+    elapsed = time.time() - start
+
+    failures = [r for r in results if r['error']]
+    for result in sorted(results, key=lambda r: r['elapsed'], reverse=True):
+        status = 'FAIL' if result['error'] else 'ok'
+        print '%8.2fs %-4s %s Test[%s]: %s' % (
+            result['elapsed'], status, result['node'], result['module'],
+            result['name'])
+        if result['error'] or args.verbose:
+            print result['output']
+            print result['error'] or ''
+
+    serial = sum([r['elapsed'] for r in results])
+    print 'Ran %s testcases in %s units in %.2fs (%.2fs serial), %s failed' % \
+        (len(results), len(units), elapsed, serial, len(failures))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -29,6 +29,7 @@ class TestCase(object):
         self.exitcode = kwargs.get('exitcode', 0)
         self.idempotent = kwargs.get('idempotent', True)
         self.changed = kwargs.get('changed', True)
+        self.resource = kwargs.get('resource', self.module)
 
         self.arguments = kwargs.get('arguments', list())
         self.variables = dict()
@@ -162,6 +163,10 @@ def setup():
     assert len(nodes) > 0, 'no test nodes loaded, does eapi.conf exist?'
 
     modules = os.environ.get('ANSIBLE_TEST_CASES')
+    testcases.extend(load_testcases(modules))
+
+def load_testcases(modules=None):
+    loaded = list()
 
     testcases_home = os.path.join(here, 'testcases')
     filenames = os.listdir(testcases_home)
@@ -174,7 +179,9 @@ def setup():
         for testcase in definition['testcases']:
             kwargs = defaults.copy()
             kwargs.update(testcase)
-            testcases.append(TestCase(**kwargs))
+            loaded.append(TestCase(**kwargs))
+
+    return loaded
 
 
 def test_module():